@@ -1,89 +1,233 @@
+import asyncio
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import hashlib
 import logging
+import zlib
 
+from django.conf import settings
+from django.db import connections, transaction
 import requests
 
-from .clients import ClientFactory
+from .clients import AsyncClient, ClientFactory
 from .exceptions import DacaNewsException
-from .forms import ApiResponseForm, ArticleForm, SourceForm, strip_tags_and_format
-from .models import Article, Source
+from .front_page import build_front_page_snapshot
+from .metrics import observe_ingest_run
+from .forms import (
+    ApiResponseForm, strip_tags_and_format
+)
+from .utils import normalize_title, truncate_in_middle
+from .models import (
+    DISPLAY_TITLE_LENGTH, ApiPayload, Article, FetchWatermark, IngestGeneration, IngestRun, Source
+)
+from .sources import SourceCache, source_cache
+from .stats import RunStats
+from .validators import article_validator, source_validator
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_TITLE_WINDOW = datetime.timedelta(days=15)
+
 
 class ArticlePipeline:
     def __init__(self, news_client):
         self.news_client = news_client
 
     @staticmethod
-    def check_duplicate_article_diff_source_exist(article_dict):
+    def get_title_key(article_record):
+        """
+        Return the normalized title an article record is stored with.
+        Stored titles were sanitized by validation, see Article.save,
+        so the raw title is sanitized the same way first.
+        """
+        return normalize_title(strip_tags_and_format(article_record.title or ''))
+
+    @staticmethod
+    def check_duplicate_article_diff_source_exist(article_record):
         """
-        Check if an article with the same title exist between
-        the publish date and 15 days back, since an article
+        Check if an article with the same normalized title exist
+        within 15 days of the publish date, since an article
         can have the same name but from a different source.
         """
-        title = strip_tags_and_format(article_dict.get('title'))
-        end_date = article_dict['published_at'] + datetime.timedelta(days=15)
-        start_date = article_dict['published_at'] - datetime.timedelta(days=15)
-        return Article.objects.filter(title=title).filter(
-            published_at__range=(start_date, end_date)).exists()
+        title_key = ArticlePipeline.get_title_key(article_record)
+        end_date = article_record.published_at + DUPLICATE_TITLE_WINDOW
+        start_date = article_record.published_at - DUPLICATE_TITLE_WINDOW
+        return Article.objects.filter(
+            title_key=title_key, published_at__range=(start_date, end_date)).exists()
 
     @staticmethod
-    def is_new_article(article_dict):
+    def is_new_article(article_record):
         """
         Validate whether an article should be saved by checking
         some edge cases.
         Do not save (return False) if any edge case function returns True.
         """
         return not any([
-            ArticlePipeline.check_duplicate_article_diff_source_exist(article_dict)
+            ArticlePipeline.check_duplicate_article_diff_source_exist(article_record)
         ])
 
     @staticmethod
-    def get_source(source_dict):
+    def get_source(source_record, stats=None):
         """
         Get or create a Source instance from news_client response.
+        Source cache hits and misses are counted on stats, if given.
         """
-        # Check if source exists in db first.
+        # Check if source exists in the cache (or db) first.
         # Use only name because form validation populates slug if empty.
-        name = strip_tags_and_format(source_dict.get('name'))
-        source = Source.objects.filter(name__iexact=name).first()
+        name = strip_tags_and_format(source_record.name or '')
+        source = source_cache.get(name, stats and stats.source_cache)
         if source:
             return source
 
-        # If source is new, populate and attempt to create from form.
-        source_form = SourceForm(source_dict)
-        if not source_form.is_valid():
-            logger.error(source_form.errors.as_data(), extra={
-                'source_name': source_dict.get('name'),
-                'source_slug': source_dict.get('slug')
+        # If source is new, validate and attempt to create it.
+        source, errors = source_validator.build(source_record)
+        if errors:
+            logger.error(errors, extra={
+                'source_name': source_record.name,
+                'source_slug': source_record.slug
             })
             return
 
         logger.info('Saving Source')
-        return source_form.save()
+        source.save()
+        source_cache.add(source)
+        return source
 
     @staticmethod
-    def create_article(article_dict, source_obj):
+    def log_article_errors(errors, article_record):
+        logger.error(errors, extra={
+            'article_title': article_record.title,
+            'article_url': article_record.url,
+            'article_author': article_record.author,
+            'article_pub_date': article_record.published_at
+        })
+
+    @staticmethod
+    def create_article(article_record, source_obj, stats=None):
         """
         Create Article instance from news_client response and source.
+        Validation and the insert are timed on stats, if given.
         """
-        # Add source to news_client dict before populating form.
-        article_dict['source'] = source_obj.id
+        stats = stats or RunStats()
 
-        article_form = ArticleForm(article_dict)
-
-        if not article_form.is_valid():
-            logger.error(article_form.errors.as_data(), extra={
-                'article_title': article_dict.get('title'),
-                'article_url': article_dict.get('url'),
-                'article_author': article_dict.get('author'),
-                'article_pub_date': article_dict.get('published_at')
-            })
+        with stats.stage('validation', items=1):
+            article, errors = article_validator.build(article_record, source=source_obj)
+        if errors:
+            ArticlePipeline.log_article_errors(errors, article_record)
             return
 
         logger.info('Saving article')
-        article_form.save()
+        # The post_save signal bumps the source's article count, commit
+        # both together.
+        with stats.stage('db_write', items=1), transaction.atomic():
+            article.save()
+        return article
+
+    @staticmethod
+    def get_known_articles(page):
+        """
+        Return the urls, and the publish dates by normalized title, of
+        the stored articles a page could duplicate, with two queries.
+        """
+        title_keys = {ArticlePipeline.get_title_key(article) for article, _ in page}
+        urls = {article.url for article, _ in page}
+        published = [article.published_at for article, _ in page]
+
+        known_urls = set(Article.objects.filter(url__in=urls).values_list('url', flat=True))
+
+        known_titles = defaultdict(list)
+        title_matches = Article.objects.filter(
+            title_key__in=title_keys,
+            published_at__range=(
+                min(published) - DUPLICATE_TITLE_WINDOW,
+                max(published) + DUPLICATE_TITLE_WINDOW
+            )
+        ).values_list('title_key', 'published_at')
+        for title_key, published_at in title_matches:
+            known_titles[title_key].append(published_at)
+        return known_urls, known_titles
+
+    @staticmethod
+    def is_known_article(article_record, known_urls, known_titles):
+        """
+        Whether an article is already stored or duplicates a title
+        published within DUPLICATE_TITLE_WINDOW, see get_known_articles.
+        """
+        title_key = ArticlePipeline.get_title_key(article_record)
+        return article_record.url in known_urls or any(
+            abs(article_record.published_at - date) <= DUPLICATE_TITLE_WINDOW
+            for date in known_titles[title_key]
+        )
+
+    @staticmethod
+    def build_article(article_record, source_record, stats):
+        """
+        Resolve the source and validate an article for bulk_create,
+        returning None if either is invalid.
+        """
+        with stats.stage('source_lookup', items=1):
+            source = ArticlePipeline.get_source(source_record, stats)
+        if not source:
+            return None
+
+        # Url uniqueness is checked for the whole page by get_known_articles.
+        with stats.stage('validation', items=1):
+            article, errors = article_validator.build(
+                article_record, check_unique=False, source=source
+            )
+        if errors:
+            ArticlePipeline.log_article_errors(errors, article_record)
+            return None
+
+        # bulk_create skips Article.save, so set the title fields here.
+        article.title_key = normalize_title(article.title)
+        article.display_title = truncate_in_middle(article.title, DISPLAY_TITLE_LENGTH)
+        return article
+
+    @staticmethod
+    def save_article_page(page, stats=None):
+        """
+        Validate and store a page of (article, source) records with a
+        handful of set-based queries and a single bulk insert, all
+        inside one transaction. Stages are timed on stats, if given.
+
+        Returns a Counter of inserted, skipped (already stored or
+        duplicate title) and rejected (invalid) articles.
+        """
+        counts = Counter(inserted=0, skipped=0, rejected=0)
+        if not page:
+            return counts
+        stats = stats or RunStats()
+
+        with transaction.atomic():
+            with stats.stage('duplicate_check', items=len(page)):
+                known_urls, known_titles = ArticlePipeline.get_known_articles(page)
+
+            new_articles = []
+            for article_record, source_record in page:
+                if ArticlePipeline.is_known_article(article_record, known_urls, known_titles):
+                    counts['skipped'] += 1
+                    continue
+
+                article = ArticlePipeline.build_article(article_record, source_record, stats)
+                if not article:
+                    counts['rejected'] += 1
+                    continue
+                new_articles.append(article)
+
+                # Catch duplicates within the page itself.
+                known_urls.add(article_record.url)
+                known_titles[article.title_key].append(article.published_at)
+
+            with stats.stage('db_write', items=len(new_articles)):
+                Article.objects.bulk_create(new_articles)
+
+                # bulk_create sends no post_save signal, count per source here.
+                Source.add_article_counts(Counter(article.source_id for article in new_articles))
+            counts['inserted'] += len(new_articles)
+
+        return counts
 
     @staticmethod
     def create_api_response(api_resp_dict):
@@ -98,42 +242,396 @@ class ArticlePipeline:
 
         api_resp_form.save()
 
-    def fetch_and_save_articles(self, params={}):
+    @staticmethod
+    def create_api_payload(content):
         """
-        Make news_client API call via instance fetch method, then
-        validate and store articles, sources, and api response.
+        Get or create the compressed ApiPayload for a raw response body.
         """
-        try:
-            # Save articles and sources if valid.
-            for article_dict, source_dict in self.news_client.fetch_articles(params=params):
-
-                is_new = ArticlePipeline.is_new_article(article_dict)
-                logger.info(f'New Article Check --> {is_new}')
+        digest = hashlib.sha256(content).hexdigest()
+        payload, _ = ApiPayload.objects.get_or_create(digest=digest, defaults={
+            'data': zlib.compress(content),
+            'size': len(content)
+        })
+        return payload
 
-                if is_new:
-                    logger.info(f'New Article url --> {article_dict["url"]}')
-                    source = ArticlePipeline.get_source(source_dict)
-                    if source:
-                        ArticlePipeline.create_article(article_dict, source)
-
-            # Save the API Response.
+    def save_response(self, response):
+        """
+        Store a page's raw response body as a deduplicated payload,
+        along with the url that returned it. Both are committed
+        together, so compact_api_responses never sees the payload
+        without its response and deletes it as unused.
+        """
+        with self.stats.stage('save_response', items=1), transaction.atomic():
+            payload = ArticlePipeline.create_api_payload(response.content)
             ArticlePipeline.create_api_response({
                 'source': str(self.news_client),
-                'response': self.news_client.response.json(),
-                'url': self.news_client.response.url
+                'payload': payload.id,
+                'url': response.url
             })
 
-        except requests.exceptions.RequestException as e:
-            raise DacaNewsException(
+    def start_run(self, incremental=False, replay=False):
+        """
+        Reset the per-run counters and stage timings, and warm the
+        source cache before fetching articles.
+
+        In incremental mode the client's stored watermark is loaded
+        so requests can be narrowed and pagination stopped early.
+        A replay of old responses leaves the watermark alone and its
+        run is marked replay, see IngestRun.
+        """
+        self.replay = replay
+        self.stats = RunStats()
+        self.news_client.stats = self.stats
+        with self.stats.stage('start'):
+            source_cache.warm()
+        self.counts = Counter(inserted=0, skipped=0, rejected=0)
+        self.pages = 0
+
+        self.watermark = None
+        if incremental:
+            self.watermark = FetchWatermark.objects.filter(client=str(self.news_client)).first()
+        self.latest_published_at = None
+        self.latest_urls = set()
+
+    def get_run_params(self, params):
+        """
+        Narrow params to articles published since the watermark,
+        if there is one.
+        """
+        if not self.watermark:
+            return params
+        return self.news_client.narrow_params(params, self.watermark.published_at)
+
+    def is_known_page(self, page):
+        """
+        Whether every article in a page is already behind the
+        watermark, in which case there is no need to paginate further.
+        """
+        if not self.watermark:
+            return False
+        return all(self.watermark.is_known(article_record) for article_record, _ in page)
+
+    def track_latest(self, page):
+        """
+        Keep the latest published_at seen this run and the urls
+        published at that time, to store as the next watermark.
+        """
+        for article_record, _ in page:
+            published_at = article_record.published_at
+            if not self.latest_published_at or published_at > self.latest_published_at:
+                self.latest_published_at = published_at
+                self.latest_urls = set()
+            if published_at == self.latest_published_at:
+                self.latest_urls.add(article_record.url)
+
+    def save_watermark(self):
+        """
+        Move the client's watermark forward to the latest article
+        seen this run.
+        """
+        if not self.latest_published_at:
+            return
+
+        watermark, created = FetchWatermark.objects.get_or_create(
+            client=str(self.news_client),
+            defaults={
+                'published_at': self.latest_published_at,
+                'urls': sorted(self.latest_urls)
+            }
+        )
+        if created or self.latest_published_at < watermark.published_at:
+            return
+
+        if self.latest_published_at == watermark.published_at:
+            self.latest_urls.update(watermark.urls)
+        watermark.published_at = self.latest_published_at
+        watermark.urls = sorted(self.latest_urls)
+        watermark.save()
+
+    def save_page(self, page, batch=False, response=None):
+        """
+        Validate and store a page of (article, source) records, one
+        article at a time or, in batch mode, with
+        ArticlePipeline.save_article_page.
+
+        The response the page came from is stored too, if given.
+        """
+        if response is not None:
+            self.save_response(response)
+
+        self.pages += 1
+        self.track_latest(page)
+
+        # Cached pages are invalidated once, by finish_run.
+        with IngestGeneration.defer_bumps():
+            if batch:
+                self.counts.update(ArticlePipeline.save_article_page(page, stats=self.stats))
+            else:
+                self.save_articles(page)
+
+    def save_articles(self, page):
+        """
+        Validate and store articles and sources of a page one article
+        at a time.
+        """
+        for article_record, source_record in page:
+
+            with self.stats.stage('duplicate_check', items=1):
+                is_new = ArticlePipeline.is_new_article(article_record)
+            logger.info(f'New Article Check --> {is_new}')
+
+            if not is_new:
+                self.counts['skipped'] += 1
+                continue
+
+            logger.info(f'New Article url --> {article_record.url}')
+            with self.stats.stage('source_lookup', items=1):
+                source = ArticlePipeline.get_source(source_record, self.stats)
+            article = source and ArticlePipeline.create_article(article_record, source, self.stats)
+            self.counts['inserted' if article else 'rejected'] += 1
+
+    def save_run(self, error=''):
+        """
+        Store the run's counts and stage timings as an IngestRun and
+        log a summary.
+        """
+        run = IngestRun.objects.create(
+            client=str(self.news_client),
+            started_at=self.stats.started_at,
+            duration=self.stats.duration(),
+            pages=self.pages,
+            inserted=self.counts['inserted'],
+            skipped=self.counts['skipped'],
+            rejected=self.counts['rejected'],
+            stages=self.stats.summary(),
+            error=error,
+            replay=self.replay
+        )
+        observe_ingest_run(run)
+        logger.info(
+            f'{run.client} run --> {run.pages} pages in {run.duration:.2f}s, '
+            f'{run.articles_per_second:.1f} articles/sec; {self.stats.format()}',
+            extra={'run_id': run.id, 'stages': run.stages}
+        )
+        return run
+
+    def fail_run(self, e):
+        """
+        Store a run that stopped with an exception, so failing and
+        slow upstreams show up in the run history.
+        """
+        try:
+            self.save_run(error=str(self.get_exception(e)))
+        except Exception:
+            logger.exception(f'Could not save the {str(self.news_client)} run')
+
+    def finish_run(self):
+        """
+        Log the run results, move the watermark forward unless this is
+        a replay, rebuild the front page and invalidate cached pages if
+        articles were inserted, store the run and return a Counter of
+        inserted, skipped and rejected articles.
+        """
+        logger.info(f'{str(self.news_client)} results --> {dict(self.counts)}')
+
+        cache_stats = self.stats.source_cache
+        logger.info(
+            f'{str(self.news_client)} source cache --> '
+            f'{cache_stats["hits"]} hits, {cache_stats["misses"]} misses, '
+            f'{SourceCache.hit_rate(cache_stats):.0%} hit rate'
+        )
+
+        with self.stats.stage('finish'):
+            if not self.replay:
+                self.save_watermark()
+
+            # Rebuild the front page and invalidate cached pages now that
+            # there is new content.
+            if self.counts['inserted']:
+                build_front_page_snapshot()
+                IngestGeneration.bump()
+
+        self.save_run()
+        return self.counts
+
+    def get_exception(self, e):
+        """
+        Wrap an exception raised during a run in a DacaNewsException
+        naming the client and the stage that failed.
+        """
+        if isinstance(e, requests.exceptions.RequestException):
+            return DacaNewsException(
                 f'{str(self.news_client)} has an issue fetching articles - '
                 f'{str(e)}'
             )
 
+        return DacaNewsException(
+            f'Article pipeline issue with {str(self.news_client)} - '
+            f'{str(e)}'
+        )
+
+    def fetch_and_save_articles(self, params={}, batch=False, incremental=False,
+                                prefetch=None):
+        """
+        Make news_client API call via instance fetch method, then
+        validate and store articles, sources, and every api response.
+
+        In incremental mode only articles newer than the client's
+        watermark are requested where possible, and pagination stops
+        at the first page made up entirely of known articles.
+
+        Up to prefetch pages (settings.NEWS_CLIENT_PREFETCH_PAGES by
+        default) are fetched while the current one is stored, by
+        running the pipeline on IngestEngine. With 0, pages are
+        fetched and stored in turn.
+
+        Returns a Counter of inserted, skipped and rejected articles.
+        """
+        if prefetch is None:
+            prefetch = settings.NEWS_CLIENT_PREFETCH_PAGES
+        if prefetch > 0:
+            return self.fetch_and_save_on_engine(params, batch, incremental, prefetch)
+        return self.fetch_and_save_in_turn(params, batch, incremental)
+
+    def fetch_and_save_in_turn(self, params, batch, incremental):
+        """
+        Fetch a page, store it, then fetch the next one.
+        """
+        try:
+            self.start_run(incremental=incremental)
+            pages = self.news_client.fetch_pages(
+                params=self.get_run_params(params), stop=self.is_known_page
+            )
+            for response, page in pages:
+                self.save_page(page, batch=batch, response=response)
+            return self.finish_run()
+
         except Exception as e:
-            raise DacaNewsException(
-                f'Article pipeline issue with {str(self.news_client)} - '
-                f'{str(e)}'
+            self.fail_run(e)
+            raise self.get_exception(e)
+
+    def fetch_and_save_on_engine(self, params, batch, incremental, prefetch):
+        """
+        Run this pipeline alone on IngestEngine, with a queue of
+        prefetch pages, raising the exception the run failed with.
+        """
+        engine = IngestEngine([(self, params)], batch, incremental, queue_size=prefetch)
+        result = asyncio.run(engine.run())[self]
+        if isinstance(result, Exception):
+            raise self.get_exception(result)
+        return result
+
+
+class IngestEngine:
+    """
+    This class fetches articles from the clients of several pipelines
+    concurrently and stores them through a single database writer, so
+    a run takes about as long as the slowest client instead of the sum
+    of all of them.
+
+    Each client's pages are put on a bounded queue read by one writer
+    thread, since the ORM should not be used from the event loop.
+    Errors are logged per client without stopping the others, and the
+    results of run() map every pipeline to its Counter of inserted,
+    skipped and rejected articles, or to the exception it failed with.
+    """
+
+    def __init__(self, pipeline_params, batch=True, incremental=True, queue_size=8):
+        self.pipeline_params = list(pipeline_params)
+        self.batch = batch
+        self.incremental = incremental
+        self.queue_size = queue_size
+        self.results = {}
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.pages = asyncio.Queue(maxsize=self.queue_size)
+        with ThreadPoolExecutor(max_workers=1) as self.writer, \
+                ThreadPoolExecutor(max_workers=len(self.pipeline_params)) as self.fetcher:
+            await asyncio.gather(
+                self.consume(),
+                *(self.produce(pipeline, params) for pipeline, params in self.pipeline_params)
             )
+        return self.results
+
+    async def write(self, func, *args):
+        """
+        Run func on the writer thread.
+        """
+        return await self.loop.run_in_executor(self.writer, func, *args)
+
+    def failed(self, pipeline):
+        return isinstance(self.results.get(pipeline), Exception)
+
+    async def fail(self, pipeline, e):
+        self.results[pipeline] = e
+        logger.error(str(pipeline.get_exception(e)))
+        await self.write(pipeline.fail_run, e)
+
+    async def produce(self, pipeline, params):
+        """
+        Fetch a client's pages onto the queue, followed by the end of
+        the run or the exception fetching failed with, so pages
+        fetched before an error are still stored. Fetching stops once
+        the pipeline failed.
+        """
+        try:
+            await self.write(pipeline.start_run, self.incremental)
+            client = AsyncClient(pipeline.news_client, executor=self.fetcher)
+            pages = client.fetch_pages(
+                params=pipeline.get_run_params(params), stop=pipeline.is_known_page
+            )
+            async for response, page in pages:
+                if self.failed(pipeline):
+                    break
+                await self.pages.put((pipeline, 'page', (response, page)))
+        except Exception as e:
+            await self.pages.put((pipeline, 'error', e))
+        else:
+            await self.pages.put((pipeline, 'end', None))
+
+    async def consume(self):
+        """
+        Store pages from the queue in order until every client's run
+        ended, skipping those of failed pipelines.
+        """
+        running = len(self.pipeline_params)
+        while running:
+            pipeline, kind, item = await self.pages.get()
+            running -= kind != 'page'
+            if not self.failed(pipeline):
+                await self.store(pipeline, kind, item)
+
+        # Release the writer thread's database connection.
+        await self.write(connections.close_all)
+
+    async def store(self, pipeline, kind, item):
+        if kind == 'error':
+            await self.fail(pipeline, item)
+            return
+        try:
+            if kind == 'end':
+                self.results[pipeline] = await self.write(pipeline.finish_run)
+            else:
+                response, page = item
+                await self.write(pipeline.save_page, page, self.batch, response)
+        except Exception as e:
+            await self.fail(pipeline, e)
+
+
+async def fetch_and_save_all_articles(pipeline_params=None, batch=True, incremental=True,
+                                      queue_size=8):
+    """
+    Fetch articles from every registered client concurrently and store
+    them through a single database writer, see IngestEngine. Returns
+    the results of every pipeline.
+
+    Runs are incremental by default, see fetch_and_save_articles.
+    """
+    if pipeline_params is None:
+        pipeline_params = registered_pipelines.values()
+    engine = IngestEngine(pipeline_params, batch, incremental, queue_size)
+    return await engine.run()
 
 
 factory = ClientFactory()
@@ -162,3 +660,9 @@ bing_default_params = {
 
 news_api_pipeline = ArticlePipeline(news_api_client)
 bing_pipeline = ArticlePipeline(bing_client)
+
+# Pipelines and default params for every client registered with ClientFactory.
+registered_pipelines = {
+    'NewsApi': (news_api_pipeline, newsapi_default_params),
+    'Bing': (bing_pipeline, bing_default_params)
+}
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Article, Digest, Recipient, Source
+from .models import Article, Digest, IngestRun, Recipient, Source
 
 
 class DigestAdmin(admin.ModelAdmin):
@@ -13,6 +13,17 @@ class DigestAdmin(admin.ModelAdmin):
         model = Digest
 
 
+class IngestRunAdmin(admin.ModelAdmin):
+    list_display = [
+        'client', 'started_at', 'duration', 'pages', 'inserted', 'skipped', 'rejected', 'error',
+        'replay'
+    ]
+    list_filter = ['client', 'replay']
+
+    class Meta:
+        model = IngestRun
+
+
 class SourceAdmin(admin.ModelAdmin):
     list_display = ['str_']
 
@@ -26,6 +37,7 @@ class SourceAdmin(admin.ModelAdmin):
 # Register your models here.
 admin.site.register(Article)
 admin.site.register(Digest, DigestAdmin)
+admin.site.register(IngestRun, IngestRunAdmin)
 admin.site.register(Recipient)
 admin.site.register(Source, SourceAdmin)
 
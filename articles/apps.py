@@ -1,5 +1,60 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def create_search_triggers(sender, using, **kwargs):
+    from .search import create_search_triggers
+    create_search_triggers(connections[using])
+
+
+def update_source_article_count(sender, instance, created, raw, **kwargs):
+    from .models import Source
+    if raw:
+        return
+    if created:
+        Source.add_article_count(instance.source_id, 1)
+        instance._loaded_source_id = instance.source_id
+        return
+
+    # An edit may move the article to another source, see Article.from_db.
+    loaded_source_id = getattr(instance, '_loaded_source_id', None)
+    if loaded_source_id is not None and loaded_source_id != instance.source_id:
+        Source.add_article_counts({loaded_source_id: -1, instance.source_id: 1})
+    instance._loaded_source_id = instance.source_id
+
+
+def decrement_source_article_count(sender, instance, **kwargs):
+    from .models import Source
+    Source.add_article_count(instance.source_id, -1)
+
+
+def invalidate_pages(sender, raw=False, **kwargs):
+    from .models import FrontPageSnapshot, IngestGeneration
+    if raw or IngestGeneration.bumps_deferred():
+        return
+    # Mark the front page stale, the index page rebuilds it.
+    FrontPageSnapshot.objects.filter(pk=1).delete()
+    IngestGeneration.bump()
 
 
 class ArticlesConfig(AppConfig):
     name = 'articles'
+
+    def ready(self):
+        post_migrate.connect(create_search_triggers, sender=self)
+
+        # Keep Source.article_count in sync on inserts, deletes and edits
+        # moving an article to another source. bulk_create sends no
+        # signals, so ArticlePipeline.save_article_page updates the
+        # counts itself.
+        Article = self.get_model('Article')
+        post_save.connect(update_source_article_count, sender=Article)
+        post_delete.connect(decrement_source_article_count, sender=Article)
+
+        # Invalidate the front page and cached pages when content changes
+        # outside of ingest runs, e.g. in the admin. Ingest runs rebuild
+        # and bump once they finish.
+        for model in (Article, self.get_model('Source')):
+            post_save.connect(invalidate_pages, sender=model)
+            post_delete.connect(invalidate_pages, sender=model)
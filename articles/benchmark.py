@@ -0,0 +1,250 @@
+"""
+Seeded synthetic data and timing helpers for the benchmark command.
+
+Everything here writes to whatever database is active, so it should
+only run against a throwaway test database.
+"""
+import datetime
+import json
+import math
+import random
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+import requests
+from requests.adapters import BaseAdapter
+
+from .actions import ArticlePipeline, bing_default_params, newsapi_default_params
+from .clients import BingClient, NewsApiClient
+from .front_page import build_front_page_snapshot
+from .models import DISPLAY_TITLE_LENGTH, Article, Source
+from .pagination import KeysetPaginator
+from .utils import QueryCounter, normalize_title, truncate_in_middle
+from . import views
+
+WORDS = (
+    'daca dreamers immigration court ruling congress senate policy program deportation '
+    'renewal application students families border administration lawsuit judge federal '
+    'supreme vote bill reform citizenship pathway protection status recipients workers '
+    'governor state campaign election announces plans new report says amid could after'
+).split()
+
+BENCHMARK_START = datetime.datetime(2017, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def make_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))).capitalize()
+
+
+def generate_articles(count, seed=0, source_count=200, batch_size=5000):
+    """
+    Bulk insert count articles spread over source_count sources and the
+    years since BENCHMARK_START. Sources get Zipf-like popularity, so top
+    source queries see a realistic skew.
+    """
+    rng = random.Random(seed)
+    Source.objects.bulk_create([
+        Source(name=f'benchmark source {i}', slug=f'benchmark-source-{i}')
+        for i in range(source_count)
+    ])
+    # SQLite does not return ids from bulk_create in Django 3.1.
+    sources = list(Source.objects.filter(name__startswith='benchmark source ').order_by('id'))
+    weights = [1 / (rank + 1) for rank in range(len(sources))]
+    span = (timezone.now() - BENCHMARK_START).total_seconds()
+
+    for start in range(0, count, batch_size):
+        articles = []
+        for i in range(start, min(start + batch_size, count)):
+            title = make_title(rng)
+            articles.append(Article(
+                source=rng.choices(sources, weights)[0],
+                author=f'Author {rng.randint(0, 500)}',
+                title=title,
+                description=' '.join(rng.choice(WORDS) for _ in range(30)),
+                url=f'https://benchmark.example.com/{seed}/{i}',
+                image_url=(
+                    f'https://benchmark.example.com/{seed}/{i}.jpg' if rng.random() < 0.7 else ''
+                ),
+                published_at=BENCHMARK_START + datetime.timedelta(seconds=rng.uniform(0, span)),
+                title_key=normalize_title(title),
+                display_title=truncate_in_middle(title, DISPLAY_TITLE_LENGTH),
+            ))
+        Article.objects.bulk_create(articles)
+
+    Source.reconcile_article_counts()
+    build_front_page_snapshot()
+
+
+def newsapi_payload(rng, page, page_size, total, prefix):
+    articles = []
+    for i in range((page - 1) * page_size, min(page * page_size, total)):
+        articles.append({
+            'source': {'id': None, 'name': f'Benchmark source {rng.randint(0, 50)}'},
+            'author': f'Author {rng.randint(0, 500)}',
+            'title': make_title(rng),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(30)),
+            'url': f'https://benchmark.example.com/{prefix}/{i}',
+            'urlToImage': f'https://benchmark.example.com/{prefix}/{i}.jpg',
+            'publishedAt': timezone.now().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        })
+    return {'status': 'ok', 'totalResults': total, 'articles': articles}
+
+
+def bing_payload(rng, page, page_size, total, prefix):
+    articles = []
+    for i in range((page - 1) * page_size, min(page * page_size, total)):
+        articles.append({
+            'name': make_title(rng),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(30)),
+            'url': f'https://benchmark.example.com/{prefix}/{i}',
+            'image': {
+                'thumbnail': {'contentUrl': f'https://benchmark.example.com/{prefix}/{i}.jpg'}
+            },
+            'datePublished': timezone.now().strftime('%Y-%m-%dT%H:%M:%S.0000000Z'),
+            'provider': [{'name': f'Benchmark source {rng.randint(0, 50)}'}],
+        })
+    return {'totalEstimatedMatches': total, 'value': articles}
+
+
+class PayloadAdapter(BaseAdapter):
+    """
+    requests transport adapter answering every request with a generated
+    API page, so clients run their real request and pagination code
+    without touching the network.
+    """
+
+    def __init__(self, client, total, seed=0):
+        super().__init__()
+        self.client = client
+        self.total = total
+        self.rng = random.Random(seed)
+        self.prefix = f'{client}-{seed}'
+
+    def send(self, request, **kwargs):
+        query = {key: values[0] for key, values in parse_qs(urlparse(request.url).query).items()}
+        if isinstance(self.client, BingClient):
+            page_size = int(query['count'])
+            page = int(query.get('offset', 0)) // page_size + 1
+            payload = bing_payload(self.rng, page, page_size, self.total, self.prefix)
+        else:
+            page_size = int(query['pageSize'])
+            page = int(query.get('page', 1))
+            payload = newsapi_payload(self.rng, page, page_size, self.total, self.prefix)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response._content = json.dumps(payload).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def percentile(timings, percent):
+    ordered = sorted(timings)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def measure(func, repeat):
+    """
+    Call func repeat times, returning latency percentiles in
+    milliseconds and the median number of queries per call.
+    """
+    timings = []
+    queries = []
+    for i in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            func(i)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+    return {
+        'calls': repeat,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p90_ms': round(percentile(timings, 90), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / repeat, 3),
+        'max_ms': round(max(timings), 3),
+        'queries': percentile(queries, 50),
+    }
+
+
+def render_view(view, path, data=None):
+    """
+    Return a function rendering a view without middleware, so cached
+    pages do not hide its cost.
+    """
+    view_func = view.as_view()
+    factory = RequestFactory()
+
+    def render(i):
+        response = view_func(factory.get(path, data))
+        response.render()
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+    return render
+
+
+def fetch_and_save(client_class, params, total, batch, seed):
+    def run(i):
+        client = client_class()
+        client.session.mount('https://', PayloadAdapter(client, total, seed=seed * 1000 + i))
+        # Store pages in turn, on this thread's connection, so measure
+        # counts their queries. IngestEngine stores them on its writer
+        # thread.
+        ArticlePipeline(client).fetch_and_save_articles(dict(params), batch=batch, prefetch=0)
+    return run
+
+
+def truncate_titles(titles):
+    def truncate(i):
+        # Time the truncation itself rather than memo lookups.
+        truncate_in_middle.cache_clear()
+        for title in titles:
+            truncate_in_middle(title, 70)
+    return truncate
+
+
+def run_benchmarks(repeat=20, seed=0):
+    """
+    Time the views, paginator, pipeline and template tags against the
+    articles in the database, see generate_articles.
+    """
+    size = Article.objects.count()
+    paginator = KeysetPaginator(Article.objects.all(), views.ArchiveView.paginate_by)
+    deep_article = Article.objects.order_by('-published_at', '-id')[int(size * 0.9)]
+    deep_cursor = paginator.encode_cursor('next', deep_article)
+    popular_source = Source.objects.order_by('-article_count').values_list('name', flat=True)[0]
+
+    rng = random.Random(seed)
+    titles = [make_title(rng) for _ in range(1000)]
+
+    # Pipeline runs insert articles, so they go last.
+    benchmarks = {
+        'index': render_view(views.ArticleListView, '/'),
+        'archive_first_page': render_view(views.ArchiveView, '/archive/'),
+        'archive_deep_page': render_view(views.ArchiveView, '/archive/', {'cursor': deep_cursor}),
+        'archive_last_page': render_view(
+            views.ArchiveView, '/archive/', {'cursor': paginator.encode_cursor('last')}
+        ),
+        'search_term': render_view(views.SearchView, '/search/', {'q': 'daca'}),
+        'search_phrase': render_view(views.SearchView, '/search/', {'q': 'supreme court ruling'}),
+        'search_source': render_view(views.SearchView, '/search/', {'source': popular_source}),
+        'truncate_in_middle_1000_titles': truncate_titles(titles),
+        'newsapi_fetch_and_save_500': fetch_and_save(
+            NewsApiClient, newsapi_default_params, 500, False, seed
+        ),
+        'newsapi_fetch_and_save_500_batch': fetch_and_save(
+            NewsApiClient, newsapi_default_params, 500, True, seed + 1
+        ),
+        'bing_fetch_and_save_100_batch': fetch_and_save(
+            BingClient, bing_default_params, 100, True, seed + 2
+        ),
+    }
+    return {name: measure(func, repeat) for name, func in benchmarks.items()}
@@ -1,30 +1,197 @@
 from abc import ABCMeta, abstractmethod
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+from functools import cached_property, lru_cache
+from itertools import islice
 import logging
 import os
 import pytz
+import re
+import time
+from urllib import parse
 
+from django.conf import settings
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.timeout import Timeout
 
 from .exceptions import DacaNewsException
 from .paginator import NewsApiPaginatorMixin, BingPaginatorMixin
+from .records import ArticleRecord, SourceRecord
+from .stats import RunStats
 
 logger = logging.getLogger(__name__)
 
+ISO_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+ISO_DATETIME_RE = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d')
+
+
+@lru_cache(maxsize=None)
+def get_iso_suffix(datetime_format_str):
+    """
+    Return the literal text following the ISO date and time in a
+    datetime format, or None if the format doesn't start with them.
+    """
+    if not datetime_format_str.startswith(ISO_DATETIME_FORMAT):
+        return None
+    suffix = datetime_format_str[len(ISO_DATETIME_FORMAT):]
+    return None if '%' in suffix else suffix
+
+
+def parse_utc_datetime(datetime_str, datetime_format_str):
+    """
+    Parse a UTC datetime string into an aware datetime.
+
+    Both APIs use a fixed ISO layout, so the fields are sliced out
+    directly, which is several times faster than strptime. Anything
+    else goes through strptime, which also raises the usual errors.
+    """
+    suffix = get_iso_suffix(datetime_format_str)
+    if (
+        suffix is not None
+        and len(datetime_str) == 19 + len(suffix)
+        and datetime_str.endswith(suffix)
+        and ISO_DATETIME_RE.match(datetime_str)
+    ):
+        try:
+            return datetime.datetime(
+                int(datetime_str[0:4]), int(datetime_str[5:7]), int(datetime_str[8:10]),
+                int(datetime_str[11:13]), int(datetime_str[14:16]), int(datetime_str[17:19]),
+                tzinfo=pytz.utc,
+            )
+        except ValueError:
+            # Out of range fields, let strptime raise its own error.
+            pass
+    return datetime.datetime.strptime(datetime_str, datetime_format_str).replace(tzinfo=pytz.utc)
+
+
+class DeadlineRetry(Retry):
+    """
+    urllib3 Retry that also gives up once the backoff and another
+    attempt could run past its client's run deadline, so retries made
+    inside a single session.get stay within BaseClient.deadline.
+    """
+
+    def __init__(self, *args, client=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.client = self.client
+        return retry
+
+    def is_exhausted(self):
+        return super().is_exhausted() or not self.client.has_time_for(self.get_backoff_time())
+
+
+class ClientResponse:
+    """
+    Wrapper around a requests Response that decodes the JSON body and
+    the query parameters of the response url at most once, however many
+    times the client, paginator and pipeline ask for them.
+    """
+
+    def __init__(self, response: requests.Response):
+        self.raw = response
+        self.url = response.url
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        return self.raw.content
+
+    @cached_property
+    def data(self):
+        return self.raw.json()
+
+    def json(self):
+        return self.data
+
+    @cached_property
+    def query_params(self):
+        return parse.parse_qs(parse.urlparse(self.url).query)
+
 
 class BaseClient(metaclass=ABCMeta):
+    # Key of the article list in the API's JSON response.
+    articles_key = None
+
     def __init__(self):
         self.base_url = None
         self.api_key = None
-        self.response: requests.Response = None
+        self.response: ClientResponse = None
         self.datetime_format_str = None
         self.headers = {'User-Agent': f'DacaNews_{self.__str__()}'}
+        self.timeout = (settings.NEWS_CLIENT_CONNECT_TIMEOUT, settings.NEWS_CLIENT_READ_TIMEOUT)
+        self.deadline = None
+        self.session = self._build_session()
+        # Replaced by ArticlePipeline at the start of every run.
+        self.stats = RunStats()
+
+    def _build_session(self):
+        """
+        Helper function to return a requests Session with a keep-alive
+        connection pool, retrying with backoff on connection errors and
+        429 and 5xx responses.
+
+        Read timeouts and Retry-After headers are not retried/honoured,
+        and no retry is made that could run past the deadline, so that
+        a run stays within its deadline.
+        """
+        retry = DeadlineRetry(
+            total=settings.NEWS_CLIENT_MAX_RETRIES,
+            read=0,
+            backoff_factor=settings.NEWS_CLIENT_BACKOFF_FACTOR,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+            client=self
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.NEWS_CLIENT_POOL_SIZE,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def has_time_for(self, seconds):
+        """
+        Whether waiting seconds and then making a request that uses its
+        full connect and read timeouts would still end before the run
+        deadline.
+        """
+        if self.deadline is None:
+            return True
+        return time.monotonic() + seconds + sum(self.timeout) <= self.deadline
+
+    def _get_timeout(self):
+        """
+        Helper function to return the timeout for the next request. A
+        request may not take longer than the time left before the run
+        deadline, connecting and reading included.
+        """
+        if self.deadline is None:
+            return self.timeout
+
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(f'{str(self)} run deadline exceeded')
+
+        connect_timeout, read_timeout = self.timeout
+        return Timeout(total=remaining, connect=connect_timeout, read=read_timeout)
 
     @property
     def response_url(self):
         """
         The url that returned the response, derived
-        from the requests Response object stored as
+        from the ClientResponse object stored as
         self.response.
         """
         if not self.response:
@@ -37,18 +204,14 @@ class BaseClient(metaclass=ABCMeta):
         object based off the datetime format the API
         uses.
         """
-        return datetime.datetime.strptime(
-            datetime_str, self.datetime_format_str
-        ).replace(tzinfo=pytz.utc)
+        return parse_utc_datetime(datetime_str, self.datetime_format_str)
 
     def _get_date(self, datetime_str):
         """
         Helper function to return a date object based
         off the datetime format the API uses.
         """
-        return datetime.datetime.strptime(
-            datetime_str, self.datetime_format_str
-        ).replace(tzinfo=pytz.utc).date()
+        return parse_utc_datetime(datetime_str, self.datetime_format_str).date()
 
     @abstractmethod
     def update_headers(self):
@@ -58,17 +221,46 @@ class BaseClient(metaclass=ABCMeta):
         """
         pass
 
-    def make_request(self, url='', params={}):
+    @property
+    @abstractmethod
+    def endpoint(self):
+        """
+        This property should return the url of the API endpoint
+        articles are fetched from.
+        """
+        pass
+
+    def request(self, url='', params={}):
         """
         This method makes a request to a given endpoint with supplied
         parameters and stored headers (using the requests library)
-        to fetch articles and store the requests Response object as self.response.
+        and returns the response wrapped in a ClientResponse.
+
+        It does not touch self.response, so it is safe to call from
+        several threads at once.
         """
+        timeout = self._get_timeout()
         logger.info(f'Fetching {url}')
-        self.response = requests.get(url, headers=self.headers, params=params)
-        # https://github.com/psf/requests/blob/143150233162d609330941ec2aacde5ed4caa510/requests/models.py#L920
-        self.response.raise_for_status()
-        logger.info(self.response.headers)
+        with self.stats.stage('http', items=1):
+            response = self.session.get(url, headers=self.headers, params=params, timeout=timeout)
+            # https://github.com/psf/requests/blob/143150233162d609330941ec2aacde5ed4caa510/requests/models.py#L920
+            response.raise_for_status()
+        logger.info(response.headers)
+
+        response = ClientResponse(response)
+        # Decode here, so it is timed on its own and runs on the
+        # fetching thread.
+        with self.stats.stage('json_decode', items=1):
+            response.data
+        return response
+
+    def make_request(self, url='', params={}):
+        """
+        This method makes a request to a given endpoint with supplied
+        parameters and stored headers (using the requests library)
+        to fetch articles and store the ClientResponse object as self.response.
+        """
+        self.response = self.request(url=url, params=params)
 
     @abstractmethod
     def _fetch_articles(self, params={}):
@@ -82,26 +274,131 @@ class BaseClient(metaclass=ABCMeta):
     @abstractmethod
     def _serialize_articles(self, article_iterable):
         """
-        This method should yield an article and source dicts
+        This method should yield an ArticleRecord and a SourceRecord
         for each article from an article iterable returned by the API.
 
-        The article and source dicts should match the fields of
-        forms.ArticleForm and forms.SourceForm, respectively.
+        They are validated by the pipeline like forms.ArticleForm and
+        forms.SourceForm, respectively.
         """
         pass
 
-    @abstractmethod
-    def fetch_articles(self):
+    def _serialize_page(self, response):
+        """
+        Helper function to return a list of serialized (article, source)
+        tuples from a page of results.
         """
-        This method should call the _fetch_articles with any
-        params needed.
+        article_list = response.data[self.articles_key]
+        with self.stats.stage('serialize') as stage:
+            page = list(self._serialize_articles(article_list))
+            stage['items'] = len(page)
+        return page
 
-        Here you can modify any params before passing to _fetch_articles.
+    def _fetch_remaining_pages(self, params, max_pages, max_workers, stop=None):
         """
-        pass
+        Fetches every page after the current one on a bounded thread
+        pool, yielding them in page order as they complete.
+
+        The total results of the first response tell us every page
+        we will need, but only max_workers pages are requested ahead
+        of the consumer. The next page is requested once one has been
+        consumed and stop(page) didn't end pagination, so neither a
+        slow consumer nor an early stop fetches pages nobody will read.
+        """
+        last_page = self.total_pages
+        if max_pages:
+            last_page = min(max_pages, last_page)
+
+        page_numbers = iter(range(self.current_page + 1, last_page + 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = deque(
+                self._submit_page(executor, params, page_number)
+                for page_number in islice(page_numbers, max_workers)
+            )
+            try:
+                while futures:
+                    self.response = futures.popleft().result()
+                    page = self._serialize_page(self.response)
+                    yield self.response, page
+                    if stop and stop(page):
+                        break
+                    futures.extend(
+                        self._submit_page(executor, params, page_number)
+                        for page_number in islice(page_numbers, 1)
+                    )
+            finally:
+                # Don't fetch pages nobody will read if we stop early.
+                for future in futures:
+                    future.cancel()
+
+    def _submit_page(self, executor, params, page_number):
+        """
+        Helper function to request a page on an executor, returning
+        the future of its ClientResponse.
+        """
+        return executor.submit(
+            self.request, self.endpoint, {**params, **self.get_page_params(page_number)}
+        )
+
+    def fetch_pages(self, params={}, stop=None):
+        """
+        Fetches articles via pagination, yielding the ClientResponse
+        object and a list of serialized (article, source) tuples for
+        each page.
+
+        The pages after the first one are fetched concurrently on up to
+        settings.NEWS_CLIENT_MAX_WORKERS threads, at most that many
+        pages ahead of the consumer, pass max_workers to override it
+        (1 fetches them one after another). Pass deadline
+        to override the number of seconds the whole run may take.
+        Pagination ends early once stop(page) returns True for a page.
+        """
+        params, max_pages, max_workers = self._prepare_run(params)
+        while True:
+            self._fetch_articles(params=params)
+            page = self._serialize_page(self.response)
+            yield self.response, page
+            if (stop and stop(page)) or not self.continue_pagination(max_pages=max_pages):
+                break
+            if max_workers and max_workers > 1:
+                yield from self._fetch_remaining_pages(params, max_pages, max_workers, stop)
+                break
+            params = {**params, **self.get_next_params()}
+
+    def _prepare_run(self, params):
+        """
+        Helper function to split the internal max_pages, max_workers
+        and deadline params off the request params, and start the run
+        deadline. Returns (params, max_pages, max_workers).
+        """
+        # Don't pop internal params off the caller's (e.g. default) params.
+        params = {**params}
+        max_pages = params.pop('max_pages', None)
+        if max_pages == 0:
+            raise DacaNewsException('Max pages has to be > 0')
+        max_workers = params.pop('max_workers', settings.NEWS_CLIENT_MAX_WORKERS)
+        deadline = params.pop('deadline', settings.NEWS_CLIENT_RUN_DEADLINE)
+        self.deadline = time.monotonic() + deadline if deadline else None
+        return params, max_pages, max_workers
+
+    def narrow_params(self, params, since):
+        """
+        Return params restricted to articles published since a given
+        aware datetime, if the API supports it.
+        """
+        return params
+
+    def fetch_articles(self, params={}):
+        """
+        Fetches articles via pagination, one article and source
+        record at a time.
+        """
+        for _, page in self.fetch_pages(params=params):
+            yield from page
 
 
 class NewsApiClient(BaseClient, NewsApiPaginatorMixin):
+    articles_key = 'articles'
+
     def __init__(self):
         super().__init__()
         self.base_url = 'https://newsapi.org/v2/'
@@ -118,54 +415,55 @@ class NewsApiClient(BaseClient, NewsApiPaginatorMixin):
     def update_headers(self):
         self.headers['X-Api-Key'] = self.api_key
 
-    def _fetch_articles(self, params):
+    @property
+    def endpoint(self):
         """
-        Makes an API call to the 'everything' NewsAPI endpoint with
-        given params.
+        The 'everything' NewsAPI endpoint.
 
         https://newsapi.org/docs/endpoints/everything
         """
-        everything_endpoint = os.path.join(self.base_url, 'everything')
-        self.make_request(everything_endpoint, params)
+        return os.path.join(self.base_url, 'everything')
 
-    def _serialize_articles(self, article_list):
+    def narrow_params(self, params, since):
         """
-        Yield article and source dicts from a NewsAPI article list.
+        Request only articles published at or after since, via the
+        'from' param of the 'everything' endpoint.
         """
-        for raw_article in article_list:
-            article = {
-                'author': raw_article.get('author', ''),
-                'title': raw_article.get('title', ''),
-                'description': raw_article.get('description', ''),
-                'url': raw_article.get('url'),
-                'image_url': raw_article.get('urlToImage', ''),
-                'published_at': self._get_datetime(raw_article['publishedAt'])
-            }
-
-            source = {
-                'name': raw_article.get('source', {}).get('name'),
-                'slug': raw_article.get('source', {}).get('id')
-            }
+        since = since.astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%S')
+        return {**params, 'from': since}
 
-            yield article, source
+    def _fetch_articles(self, params):
+        """
+        Makes an API call to the 'everything' NewsAPI endpoint with
+        given params.
+        """
+        self.make_request(self.endpoint, params)
 
-    def fetch_articles(self, params={}):
+    def _serialize_articles(self, article_list):
         """
-        Fetches articles via pagination.
+        Yield article and source records from a NewsAPI article list.
         """
-        max_pages = params.pop('max_pages', None)
-        if max_pages == 0:
-            raise DacaNewsException('Max pages has to be > 0')
+        for raw_article in article_list:
+            article = ArticleRecord(
+                author=raw_article.get('author', ''),
+                title=raw_article.get('title', ''),
+                description=raw_article.get('description', ''),
+                url=raw_article.get('url'),
+                image_url=raw_article.get('urlToImage', ''),
+                published_at=self._get_datetime(raw_article['publishedAt'])
+            )
+
+            source = SourceRecord(
+                name=raw_article.get('source', {}).get('name'),
+                slug=raw_article.get('source', {}).get('id')
+            )
 
-        while True:
-            self._fetch_articles(params=params)
-            yield from self._serialize_articles(self.response.json()['articles'])
-            if not self.continue_pagination(max_pages=max_pages):
-                break
-            params = {**params, **self.get_next_params()}
+            yield article, source
 
 
 class BingClient(BaseClient, BingPaginatorMixin):
+    articles_key = 'value'
+
     def __init__(self):
         super().__init__()
         self.base_url = 'https://api.bing.microsoft.com/v7.0'
@@ -182,61 +480,101 @@ class BingClient(BaseClient, BingPaginatorMixin):
     def update_headers(self):
         self.headers['Ocp-Apim-Subscription-Key'] = self.api_key
 
+    @property
+    def endpoint(self):
+        """
+        The news search Bing endpoint.
+
+        https://docs.microsoft.com/en-us/rest/api/cognitiveservices-bingsearch/bing-news-api-v7-reference
+        """
+        return os.path.join(self.base_url, 'news/search')
+
+    def narrow_params(self, params, since):
+        """
+        Bing can't filter by date, only by the freshness buckets Day,
+        Week and Month, so use the smallest bucket that covers since.
+        """
+        age = datetime.datetime.now(pytz.utc) - since
+        for freshness, days in (('Day', 1), ('Week', 7), ('Month', 30)):
+            if age < datetime.timedelta(days=days):
+                return {**params, 'freshness': freshness}
+        return params
+
     def _fetch_articles(self, params):
         """
         Makes an API call to the news search Bing endpoint with
         given params.
-
-        https://docs.microsoft.com/en-us/rest/api/cognitiveservices-bingsearch/bing-news-api-v7-reference
         """
-        news_search_endpoint = os.path.join(self.base_url, 'news/search')
-        self.make_request(url=news_search_endpoint, params=params)
+        self.make_request(url=self.endpoint, params=params)
 
     def _serialize_articles(self, article_list):
         """
-        Yield article and source dicts from a Bing article list.
+        Yield article and source records from a Bing article list.
         """
         for raw_article in article_list:
-            article = {
-                'title': raw_article.get('name', ''),
-                'description': raw_article.get('description', ''),
-                'url': raw_article.get('url', ''),
-                'image_url': raw_article.get('image', {}).get('thumbnail', {}).get('contentUrl', ''),
-                'published_at': self._get_datetime(raw_article.get('datePublished'))
-            }
-
-            source = {
-                'name': raw_article.get('provider', {})[0].get('name', ''),
-                'slug': ''
-            }
+            article = ArticleRecord(
+                title=raw_article.get('name', ''),
+                description=raw_article.get('description', ''),
+                url=raw_article.get('url', ''),
+                image_url=raw_article.get('image', {}).get('thumbnail', {}).get('contentUrl', ''),
+                published_at=self._get_datetime(raw_article.get('datePublished'))
+            )
+
+            source = SourceRecord(
+                name=raw_article.get('provider', {})[0].get('name', ''),
+                slug=''
+            )
 
             yield article, source
 
-    def fetch_articles(self, params={}):
+
+class AsyncClient:
+    """
+    asyncio wrapper around a news client.
+
+    There is no async HTTP library in our requirements, so each page
+    is fetched by advancing the client's fetch_pages generator on a
+    thread pool executor. The event loop stays free to run other
+    clients in the meantime.
+    """
+
+    def __init__(self, client, executor=None):
+        self.client = client
+        self.executor = executor
+
+    def __str__(self):
+        return str(self.client)
+
+    def __repr__(self):
+        return f'AsyncClient({repr(self.client)})'
+
+    async def fetch_pages(self, params={}, stop=None):
         """
-        Fetches articles via pagination.
+        Fetches articles via pagination, yielding the same
+        (response, page) tuples as the wrapped client's fetch_pages.
         """
-        max_pages = params.pop('max_pages', None)
-        if max_pages == 0:
-            raise DacaNewsException('Max pages has to be > 0')
-
-        while True:
-            self._fetch_articles(params=params)
-            yield from self._serialize_articles(self.response.json()['value'])
-            if not self.continue_pagination(max_pages=max_pages):
-                break
-            params = {**params, **self.get_next_params()}
+        loop = asyncio.get_running_loop()
+        pages = self.client.fetch_pages(params=params, stop=stop)
+        done = object()
+        try:
+            while True:
+                page = await loop.run_in_executor(self.executor, next, pages, done)
+                if page is done:
+                    break
+                yield page
+        finally:
+            pages.close()
 
 
 class ClientFactory:
+    news_clients = {
+        'NewsApi': NewsApiClient,
+        'Bing': BingClient
+    }
 
     @staticmethod
     def get_client(key):
-        news_clients = {
-            'NewsApi': NewsApiClient,
-            'Bing': BingClient
-        }
-        client = news_clients.get(key)
+        client = ClientFactory.news_clients.get(key)
         if not client:
             raise KeyError(key)
         return client()
@@ -1,15 +1,8 @@
-import html
-
 from django import forms
 from django.template.defaultfilters import slugify
-from django.utils.html import strip_tags
 
 from .models import ApiResponse, Article, Source
-
-
-def strip_tags_and_format(html_str):
-    html_str = html.unescape(html_str)
-    return strip_tags(html_str)
+from .utils import strip_tags_and_format
 
 
 class SourceForm(forms.ModelForm):
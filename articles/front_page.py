@@ -0,0 +1,42 @@
+from django.db.models import Q
+
+from .models import Article, FrontPageSnapshot, Source
+
+
+def get_front_page():
+    """
+    Return the ids of the featured articles (lead article first) and
+    recent articles, and the names of the top 10 news sources.
+    """
+    # Define Q objects
+    daca_in_title = Q(title__icontains='daca')
+    empty_image_url = Q(image_url='')
+
+    # Get featured articles first
+    featured_article_ids = list(
+        Article.objects.filter(daca_in_title & ~empty_image_url)
+        .order_by('-published_at').values_list('id', flat=True)[:4]
+    )
+
+    # Get recent articles, exclude ids from featured articles
+    recent_article_ids = list(Article.objects.filter(
+        ~empty_image_url & ~Q(id__in=featured_article_ids)
+    ).order_by('-published_at').values_list('id', flat=True)[:12])
+
+    # Get top 10 news sources
+    top_sources = list(Source.objects.filter(article_count__gt=0).order_by(
+        '-article_count').values_list('name', flat=True)[:10])
+
+    return {
+        'featured_article_ids': featured_article_ids,
+        'recent_article_ids': recent_article_ids,
+        'top_sources': top_sources
+    }
+
+
+def build_front_page_snapshot():
+    """
+    Materialize the front page into the FrontPageSnapshot row.
+    """
+    snapshot, _ = FrontPageSnapshot.objects.update_or_create(pk=1, defaults=get_front_page())
+    return snapshot
@@ -0,0 +1,88 @@
+import json
+import logging
+import platform
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from articles.benchmark import generate_articles, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Time views, pagination, the article pipeline and template tags against '
+        'generated data in a throwaway test database, printing JSON results'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000],
+            help='Number of generated articles to benchmark against, e.g. 10000 100000 1000000.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Number of timed calls per benchmark.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the data generator, keep it fixed to compare runs.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the JSON results to this file instead of stdout.',
+        )
+
+    def run_size(self, size, options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            start = time.perf_counter()
+            generate_articles(size, seed=options['seed'])
+            generate_seconds = time.perf_counter() - start
+            self.stderr.write(f'Generated {size} articles in {generate_seconds:.1f}s')
+            return {
+                'size': size,
+                'generate_seconds': round(generate_seconds, 3),
+                'benchmarks': run_benchmarks(repeat=options['repeat'], seed=options['seed']),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def handle(self, *args, **options):
+        results = {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': [],
+        }
+
+        # Per article pipeline logging would dominate the timings, and
+        # hashed static file names need collectstatic.
+        logging.disable(logging.INFO)
+        storage = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        try:
+            with override_settings(STATICFILES_STORAGE=storage):
+                for size in options['sizes']:
+                    results['results'].append(self.run_size(size, options))
+        finally:
+            logging.disable(logging.NOTSET)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
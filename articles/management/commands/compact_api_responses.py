@@ -0,0 +1,65 @@
+import datetime
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from articles.actions import ArticlePipeline
+from articles.models import ApiPayload, ApiResponse
+
+
+class Command(BaseCommand):
+    help = 'Compress legacy API responses, apply retention and remove unused payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Delete API responses older than this many days.',
+        )
+        parser.add_argument(
+            '--no-vacuum',
+            action='store_true',
+            help='Skip reclaiming disk space with VACUUM (SQLite only).',
+        )
+
+    def compress_legacy_responses(self, chunk_size=100):
+        """
+        Move legacy uncompressed bodies into deduplicated payloads,
+        returning the number of responses converted.
+
+        The ids are collected first and the responses loaded in chunks,
+        since SQLite gives no isolation between a query being iterated
+        and updates to the same table on the same connection.
+        """
+        legacy_ids = list(
+            ApiResponse.objects.filter(payload__isnull=True, response__isnull=False)
+            .order_by('id').values_list('id', flat=True)
+        )
+        for start in range(0, len(legacy_ids), chunk_size):
+            chunk = list(ApiResponse.objects.filter(id__in=legacy_ids[start:start + chunk_size]))
+            for api_response in chunk:
+                content = json.dumps(api_response.response).encode()
+                with transaction.atomic():
+                    api_response.payload = ArticlePipeline.create_api_payload(content)
+                    api_response.response = None
+                    api_response.save(update_fields=['payload', 'response'])
+        return len(legacy_ids)
+
+    def handle(self, *args, **options):
+        converted = self.compress_legacy_responses()
+        self.stdout.write(f'Compressed {converted} legacy API responses')
+
+        if options['days'] is not None:
+            cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+            deleted, _ = ApiResponse.objects.filter(created_at__lt=cutoff).delete()
+            self.stdout.write(f'Deleted {deleted} API responses older than {cutoff}')
+
+        deleted, _ = ApiPayload.objects.filter(responses__isnull=True).delete()
+        self.stdout.write(f'Deleted {deleted} unused payloads')
+
+        if connection.vendor == 'sqlite' and not options['no_vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write('Vacuumed database')
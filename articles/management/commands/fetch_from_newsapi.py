@@ -6,5 +6,27 @@ from articles.actions import news_api_pipeline, newsapi_default_params
 class Command(BaseCommand):
     help = 'Fetch articles from NewsAPI'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Store each page with set-based queries and a single bulk insert.',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only fetch articles newer than the last stored watermark.',
+        )
+        parser.add_argument(
+            '--prefetch',
+            type=int,
+            help='Pages to fetch ahead of the page being stored, 0 to fetch and store in turn.',
+        )
+
     def handle(self, *args, **options):
-        news_api_pipeline.fetch_and_save_articles(params=newsapi_default_params)
+        news_api_pipeline.fetch_and_save_articles(
+            params=newsapi_default_params,
+            batch=options['batch'],
+            incremental=options['incremental'],
+            prefetch=options['prefetch']
+        )
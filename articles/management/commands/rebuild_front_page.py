@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from articles.front_page import build_front_page_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the front page snapshot from the stored articles'
+
+    def handle(self, *args, **options):
+        snapshot = build_front_page_snapshot()
+        self.stdout.write(
+            f'Rebuilt front page with {len(snapshot.featured_article_ids)} featured and '
+            f'{len(snapshot.recent_article_ids)} recent articles'
+        )
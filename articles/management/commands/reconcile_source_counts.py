@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from articles.models import Source
+
+
+class Command(BaseCommand):
+    help = 'Recount the articles of every source and fix drifted article counts'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Source.reconcile_article_counts()
+        self.stdout.write(f'Fixed article counts of {drifted} sources')
@@ -0,0 +1,93 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from articles.actions import ArticlePipeline
+from articles.clients import ClientFactory
+from articles.models import ApiResponse
+from articles.utils import QueryCounter
+
+
+class Command(BaseCommand):
+    help = 'Replay stored API responses or JSONL dumps through the article pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--client',
+            choices=list(ClientFactory.news_clients),
+            help='Only replay responses of this client. Required with --jsonl.',
+        )
+        parser.add_argument(
+            '--jsonl',
+            help='Replay a file with one raw API response body per line instead of the db.',
+        )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Store each page with set-based queries and a single bulk insert.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Number of stored responses loaded into memory at a time.',
+        )
+
+    def get_pages(self, pipelines, options):
+        """
+        Yield (pipeline, page data) pairs one at a time, so memory
+        stays bounded however many responses are replayed.
+        """
+        if options['jsonl']:
+            return self.get_jsonl_pages(pipelines[options['client']], options['jsonl'])
+        return self.get_stored_pages(pipelines, options['chunk_size'])
+
+    @staticmethod
+    def get_jsonl_pages(pipeline, path):
+        with open(path) as jsonl:
+            for line in jsonl:
+                if line.strip():
+                    yield pipeline, json.loads(line)
+
+    @staticmethod
+    def get_stored_pages(pipelines, chunk_size):
+        # Responses are stored under the client's str(), e.g. 'NewsAPI'.
+        pipelines = {str(pipeline.news_client): pipeline for pipeline in pipelines.values()}
+        api_responses = ApiResponse.objects.filter(source__in=pipelines).select_related('payload')
+        for api_response in api_responses.order_by('id').iterator(chunk_size=chunk_size):
+            data = api_response.get_response()
+            if data:
+                yield pipelines[api_response.source], data
+
+    def handle(self, *args, **options):
+        if options['jsonl'] and not options['client']:
+            raise CommandError('--client is required with --jsonl')
+
+        keys = [options['client']] if options['client'] else list(ClientFactory.news_clients)
+        pipelines = {key: ArticlePipeline(ClientFactory.get_client(key)) for key in keys}
+
+        for pipeline in pipelines.values():
+            pipeline.start_run(replay=True)
+
+        counter = QueryCounter()
+        articles = 0
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for pipeline, data in self.get_pages(pipelines, options):
+                client = pipeline.news_client
+                page = list(client._serialize_articles(data.get(client.articles_key, [])))
+                pipeline.save_page(page, batch=options['batch'])
+                articles += len(page)
+        elapsed = time.perf_counter() - start
+
+        for key, pipeline in pipelines.items():
+            counts = pipeline.finish_run()
+            self.stdout.write(f'{key}: {dict(counts)}')
+
+        self.stdout.write(
+            f'Replayed {articles} articles in {elapsed:.2f}s - '
+            f'{articles / elapsed if elapsed else 0:.1f} articles/sec, '
+            f'{counter.count / articles if articles else 0:.2f} queries/article'
+        )
@@ -0,0 +1,135 @@
+"""
+Prometheus metrics of the web and worker processes.
+
+gunicorn workers and the huey consumer each record into their own
+process. When the prometheus_multiproc_dir env var is set (see
+bin/entrypoint.sh) the samples are written to memory mapped files in
+that directory and /metrics aggregates every process. Without it,
+/metrics only reports the process serving it.
+"""
+import os
+import time
+
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .models import Article, IngestRun
+
+REQUEST_LATENCY = Histogram(
+    'dacanews_request_duration_seconds',
+    'Time to respond to a request, by view name.',
+    ['view', 'status'],
+)
+PAGE_CACHE_REQUESTS = Counter(
+    'dacanews_page_cache_requests_total',
+    'Requests for cached pages, by hit, stale or miss.',
+    ['status'],
+)
+INGEST_RUN_DURATION = Histogram(
+    'dacanews_ingest_run_duration_seconds',
+    'Duration of ingest runs, by news client.',
+    ['client', 'outcome'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+INGESTED_ARTICLES = Counter(
+    'dacanews_ingested_articles_total',
+    'Articles handled by ingest runs, by news client and result.',
+    ['client', 'result'],
+)
+
+
+class FreshnessCollector:
+    """
+    Gauges computed from the database at scrape time, so they are
+    correct whichever process last ingested articles.
+    """
+
+    def collect(self):
+        now = timezone.now()
+
+        newest = Article.objects.aggregate(newest=Max('published_at'))['newest']
+        article_age = GaugeMetricFamily(
+            'dacanews_newest_article_age_seconds',
+            'Seconds since the newest stored article was published.',
+        )
+        if newest:
+            article_age.add_metric([], (now - newest).total_seconds())
+        yield article_age
+
+        run_age = GaugeMetricFamily(
+            'dacanews_last_ingest_run_age_seconds',
+            'Seconds since the last successful ingest run started, by news client.',
+            labels=['client'],
+        )
+        last_runs = IngestRun.objects.filter(error='', replay=False).values('client').annotate(
+            last_started_at=Max('started_at')
+        ).order_by()
+        for run in last_runs:
+            run_age.add_metric([run['client']], (now - run['last_started_at']).total_seconds())
+        yield run_age
+
+
+def get_registry():
+    if 'prometheus_multiproc_dir' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+freshness_collector = FreshnessCollector()
+
+
+def metrics_view(request):
+    """
+    Expose every metric in the Prometheus text format.
+    """
+    registry = CollectorRegistry()
+    registry.register(freshness_collector)
+    output = generate_latest(get_registry()) + generate_latest(registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+def observe_ingest_run(run):
+    """
+    Record an IngestRun's duration and article counts. Replays are
+    left out, so they don't look like the news clients are healthy.
+    """
+    if run.replay:
+        return
+    outcome = 'failure' if run.error else 'success'
+    INGEST_RUN_DURATION.labels(run.client, outcome).observe(run.duration)
+    for result in ('inserted', 'skipped', 'rejected'):
+        INGESTED_ARTICLES.labels(run.client, result).inc(getattr(run, result))
+
+
+class MetricsMiddleware:
+    """
+    Record the latency of every request by view name, and the status of
+    requests for pages cached by IngestCacheMiddleware. It should be
+    the first middleware so the time spent in the others is included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else 'none'
+        REQUEST_LATENCY.labels(view, response.status_code).observe(duration)
+
+        cache_status = getattr(request, 'cache_status', None)
+        if cache_status:
+            PAGE_CACHE_REQUESTS.labels(cache_status).inc()
+
+        return response
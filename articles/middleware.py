@@ -0,0 +1,180 @@
+import hashlib
+import io
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection, connections
+from django.urls import Resolver404, resolve
+
+from .models import IngestGeneration
+from .utils import QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+class IngestCacheMiddleware:
+    """
+    Cache article pages until the next ingest run stores new articles.
+
+    Pages are cached without a timeout under the ingest generation they
+    were rendered at. Once ArticlePipeline bumps the generation, the
+    stale page is still served while a background thread renders the
+    new one, so no request waits on a rebuild.
+
+    The background render runs a new request through the middleware
+    below this one, so it must sit above the session and auth
+    middleware that views and templates rely on.
+    """
+    cached_url_names = {'index', 'archive', 'search'}
+    refresh_lock_timeout = 60
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[settings.CACHE_MIDDLEWARE_ALIAS]
+
+    def is_cacheable_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        try:
+            # Set like Django does for the view, so cache hits are
+            # attributed to their view in metrics.
+            request.resolver_match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return request.resolver_match.url_name in self.cached_url_names
+
+    @staticmethod
+    def is_cacheable_response(response):
+        return (
+            response.status_code == 200 and
+            not response.streaming and
+            not response.cookies
+        )
+
+    @staticmethod
+    def get_cache_key(request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return f'ingest-cache.{path}'
+
+    def store(self, key, generation, response):
+        if self.is_cacheable_response(response):
+            self.cache.set(key, (generation, response), timeout=None)
+
+    def refresh(self, environ, key, generation):
+        """
+        Render a page again for the current generation. Runs in a
+        background thread.
+        """
+        try:
+            request = WSGIRequest({**environ, 'wsgi.input': io.BytesIO(b'')})
+            self.store(key, generation, self.get_response(request))
+        except Exception:
+            logger.exception(f'Could not refresh cached page {environ.get("PATH_INFO")}')
+        finally:
+            self.cache.delete(f'{key}.refreshing')
+            connections.close_all()
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+
+        generation = IngestGeneration.current()
+        key = self.get_cache_key(request)
+        entry = self.cache.get(key)
+
+        if entry and entry[0] == generation:
+            request.cache_status = 'hit'
+            return entry[1]
+
+        if entry:
+            # Only one request per page starts a refresh.
+            if self.cache.add(f'{key}.refreshing', True, self.refresh_lock_timeout):
+                threading.Thread(
+                    target=self.refresh, args=(request.META, key, generation),
+                    name='ingest-cache-refresh', daemon=True
+                ).start()
+            request.cache_status = 'stale'
+            return entry[1]
+
+        request.cache_status = 'miss'
+        response = self.get_response(request)
+        self.store(key, generation, response)
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the query count, SQL time, template render time and page
+    cache status of every request.
+
+    The metrics are sent back in a Server-Timing header, readable in the
+    browser's network tab, and logged as JSON fields. Requests running
+    more than REQUEST_METRICS_QUERY_BUDGET queries, usually an N+1 in a
+    template, log a warning with the most repeated queries.
+
+    Enabled with the REQUEST_METRICS_ENABLED env var. It should be the
+    first middleware so the page cache is inside it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = settings.REQUEST_METRICS_QUERY_BUDGET
+
+    def process_template_response(self, request, response):
+        # Django renders the response right after the template response
+        # middleware, and runs post render callbacks once it is done.
+        render_start = time.perf_counter()
+
+        def record_render_time(rendered):
+            request.template_render_time = time.perf_counter() - render_start
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+    @staticmethod
+    def get_server_timing(metrics):
+        timings = [
+            f'total;dur={metrics["duration_ms"]}',
+            f'db;dur={metrics["sql_ms"]};desc="{metrics["query_count"]} queries"',
+        ]
+        if metrics['template_ms'] is not None:
+            timings.append(f'template;dur={metrics["template_ms"]}')
+        if metrics['cache_status']:
+            timings.append(f'cache;desc={metrics["cache_status"]}')
+        return ', '.join(timings)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        template_render_time = getattr(request, 'template_render_time', None)
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'status_code': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'query_count': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 3),
+            'template_ms': (
+                round(template_render_time * 1000, 3) if template_render_time is not None else None
+            ),
+            'cache_status': getattr(request, 'cache_status', None),
+        }
+        response['Server-Timing'] = self.get_server_timing(metrics)
+        logger.info('Request metrics', extra=metrics)
+
+        if recorder.count > self.query_budget:
+            logger.warning(
+                f'{request.path} ran {recorder.count} queries, '
+                f'over the budget of {self.query_budget}',
+                extra={**metrics, 'queries': recorder.most_repeated()}
+            )
+
+        return response
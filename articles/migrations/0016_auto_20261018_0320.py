@@ -0,0 +1,34 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+from articles.utils import normalize_title
+
+
+def backfill_title_key(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    articles = []
+    for article in Article.objects.only('id', 'title').iterator(chunk_size=2000):
+        article.title_key = normalize_title(article.title)
+        articles.append(article)
+    Article.objects.bulk_update(articles, ['title_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0015_auto_20201027_1057'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='title_key',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_title_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['title_key', 'published_at'], name='article_title_key_pub_idx'),
+        ),
+    ]
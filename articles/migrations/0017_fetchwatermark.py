@@ -0,0 +1,23 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0016_auto_20261018_0320'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.CharField(max_length=20, unique=True)),
+                ('published_at', models.DateTimeField()),
+                ('urls', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
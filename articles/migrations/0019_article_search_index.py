@@ -0,0 +1,24 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:40
+
+from django.db import migrations
+
+from articles.search import create_search_index, drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0018_auto_20261018_0325'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
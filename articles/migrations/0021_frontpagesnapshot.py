@@ -0,0 +1,23 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0020_ingestgeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrontPageSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('featured_article_ids', models.JSONField(default=list)),
+                ('recent_article_ids', models.JSONField(default=list)),
+                ('top_sources', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
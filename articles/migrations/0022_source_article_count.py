@@ -0,0 +1,43 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from articles.search import create_search_triggers, drop_search_triggers
+
+
+def drop_triggers(apps, schema_editor):
+    drop_search_triggers(schema_editor.connection)
+
+
+def create_triggers(apps, schema_editor):
+    create_search_triggers(schema_editor.connection)
+
+
+def backfill_article_count(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    Source = apps.get_model('articles', 'Source')
+    counts = Article.objects.filter(source=OuterRef('pk')).order_by().values(
+        'source').annotate(total=Count('id')).values('total')
+    Source.objects.update(article_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0021_frontpagesnapshot'),
+    ]
+
+    operations = [
+        # SQLite rebuilds the source table to add the column, which fails
+        # while the search triggers reference it.
+        migrations.RunPython(drop_triggers, create_triggers),
+        migrations.AddField(
+            model_name='source',
+            name='article_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_article_count, migrations.RunPython.noop),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
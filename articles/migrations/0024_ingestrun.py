@@ -0,0 +1,32 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0023_article_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client', models.CharField(max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField()),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('inserted', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('stages', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ingestrun',
+            index=models.Index(fields=['client', '-started_at'], name='ingestrun_client_started_idx'),
+        ),
+    ]
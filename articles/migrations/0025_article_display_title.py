@@ -0,0 +1,43 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+from articles.search import create_search_triggers, drop_search_triggers
+from articles.utils import truncate_in_middle
+
+
+def drop_triggers(apps, schema_editor):
+    drop_search_triggers(schema_editor.connection)
+
+
+def create_triggers(apps, schema_editor):
+    create_search_triggers(schema_editor.connection)
+
+
+def backfill_display_title(apps, schema_editor):
+    Article = apps.get_model('articles', 'Article')
+    articles = []
+    for article in Article.objects.only('id', 'title').iterator(chunk_size=2000):
+        article.display_title = truncate_in_middle(article.title, 70)
+        articles.append(article)
+    Article.objects.bulk_update(articles, ['display_title'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0024_ingestrun'),
+    ]
+
+    operations = [
+        # SQLite rebuilds the article table to add the column, which fails
+        # while the search triggers reference it.
+        migrations.RunPython(drop_triggers, create_triggers),
+        migrations.AddField(
+            model_name='article',
+            name='display_title',
+            field=models.CharField(blank=True, editable=False, max_length=70),
+        ),
+        migrations.RunPython(backfill_display_title, migrations.RunPython.noop),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles', '0025_article_display_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestrun',
+            name='replay',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,4 +1,16 @@
+from contextlib import contextmanager
+import json
+import threading
+import zlib
+
 from django.db import models
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .utils import normalize_title, truncate_in_middle
+
+# Length the article cards truncate titles to.
+DISPLAY_TITLE_LENGTH = 70
 
 
 # Create your models here.
@@ -12,28 +24,218 @@ class Article(models.Model):
     published_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     public = models.BooleanField(default=False)
+    # Normalized title used for cross-source duplicate detection.
+    title_key = models.CharField(max_length=500, blank=True, editable=False)
+    # Title truncated for article cards, computed at ingest.
+    display_title = models.CharField(max_length=DISPLAY_TITLE_LENGTH, blank=True, editable=False)
+
+    class Meta:
+        # Every listing orders by -published_at, see tests.QueryPlanTests.
+        indexes = [
+            models.Index(fields=['title_key', 'published_at'], name='article_title_key_pub_idx'),
+            models.Index(fields=['-published_at'], name='article_published_at_idx'),
+            models.Index(
+                fields=['-published_at'], name='article_with_image_pub_idx',
+                condition=~models.Q(image_url='')
+            ),
+            models.Index(fields=['source', '-published_at'], name='article_source_pub_idx'),
+        ]
 
     def __str__(self):
         return f'Article [title - {self.title[:20]}, source - {self.source_id}]'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored source, so moving the article to another
+        # source moves its count too, see apps.py.
+        instance._loaded_source_id = instance.__dict__.get('source_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.title_key = normalize_title(self.title)
+        self.display_title = truncate_in_middle(self.title, DISPLAY_TITLE_LENGTH)
+        super().save(*args, **kwargs)
+
 
 class Source(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.CharField(max_length=50, unique=True, blank=True)
+    # Denormalized number of articles, kept up to date on every insert
+    # and delete. reconcile_source_counts repairs any drift.
+    article_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
 
     def __str__(self):
         return f'Source {self.slug} {self.id}'
 
+    @classmethod
+    def add_article_count(cls, source_id, amount):
+        """
+        Atomically add amount (which may be negative) to the article
+        count of a source.
+        """
+        cls.add_article_counts({source_id: amount})
+
+    @classmethod
+    def add_article_counts(cls, amounts):
+        """
+        Atomically add amounts, a dict of source id to amount (which
+        may be negative), to the article counts of several sources
+        with a single query.
+        """
+        amounts = {source_id: amount for source_id, amount in amounts.items() if amount}
+        if not amounts:
+            return
+        cls.objects.filter(pk__in=amounts).update(article_count=F('article_count') + Case(
+            *(When(pk=source_id, then=Value(amount)) for source_id, amount in amounts.items()),
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+
+    @classmethod
+    def reconcile_article_counts(cls):
+        """
+        Recount the articles of every source, returning the number of
+        sources whose count had drifted.
+        """
+        counts = dict(
+            Article.objects.values('source').annotate(total=models.Count('id'))
+            .values_list('source', 'total')
+        )
+        drifted = [
+            source for source in cls.objects.only('id', 'article_count')
+            if source.article_count != counts.get(source.id, 0)
+        ]
+        for source in drifted:
+            source.article_count = counts.get(source.id, 0)
+        cls.objects.bulk_update(drifted, ['article_count'], batch_size=500)
+        return len(drifted)
+
 
 class ApiResponse(models.Model):
     source = models.CharField(max_length=20, blank=True)
-    response = models.JSONField(null=True)
+    # Legacy uncompressed body, new responses are stored as a payload.
+    response = models.JSONField(null=True, blank=True)
+    payload = models.ForeignKey(
+        'ApiPayload', on_delete=models.PROTECT, null=True, blank=True, related_name='responses'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     url = models.URLField(blank=True)
 
     def __str__(self):
         return f'APIResponse [source - {self.source}, created - {self.created_at}]'
 
+    def get_response(self):
+        """
+        The decoded JSON body, from the payload or the legacy column.
+        """
+        if self.payload_id:
+            return self.payload.get_data()
+        return self.response
+
+
+class ApiPayload(models.Model):
+    """
+    A raw API response body, zlib compressed and keyed by the sha256 of
+    the uncompressed body so identical pages are only stored once.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'ApiPayload [digest - {self.digest[:12]}, size - {self.size}]'
+
+    def get_data(self):
+        return json.loads(zlib.decompress(self.data))
+
+
+class FetchWatermark(models.Model):
+    """
+    High-water mark of a news client: the latest published_at stored
+    and the urls of the articles published at that exact time.
+    """
+    client = models.CharField(max_length=20, unique=True)
+    published_at = models.DateTimeField()
+    urls = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'FetchWatermark [client - {self.client}, published - {self.published_at}]'
+
+    def is_known(self, article_record):
+        """
+        Whether an article was published before the mark, or at the
+        mark and already seen.
+        """
+        published_at = article_record.published_at
+        return published_at < self.published_at or (
+            published_at == self.published_at and article_record.url in self.urls
+        )
+
+
+class IngestGeneration(models.Model):
+    """
+    Single row counter bumped whenever an ingest run stores new
+    articles, and whenever an article or source is saved or deleted
+    elsewhere, e.g. in the admin. Cached pages are only valid for the
+    generation they were rendered at.
+    """
+    value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Per thread flag set while ingest runs store pages.
+    _bumps = threading.local()
+
+    def __str__(self):
+        return f'IngestGeneration [value - {self.value}, updated - {self.updated_at}]'
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(value=F('value') + 1, updated_at=timezone.now())
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={'value': 1})
+
+    @classmethod
+    @contextmanager
+    def defer_bumps(cls):
+        """
+        Skip the bumps of model signals in the block, for ingest runs
+        that bump once when they finish.
+        """
+        deferred = getattr(cls._bumps, 'deferred', False)
+        cls._bumps.deferred = True
+        try:
+            yield
+        finally:
+            cls._bumps.deferred = deferred
+
+    @classmethod
+    def bumps_deferred(cls):
+        return getattr(cls._bumps, 'deferred', False)
+
+
+class FrontPageSnapshot(models.Model):
+    """
+    Single row holding the article ids and top sources shown on the
+    index page, rebuilt whenever an ingest run stores new articles.
+    Saving or deleting an article or source elsewhere, e.g. in the
+    admin, deletes it, and the index page builds it again.
+    The first featured article is the lead article.
+    """
+    featured_article_ids = models.JSONField(default=list)
+    recent_article_ids = models.JSONField(default=list)
+    top_sources = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'FrontPageSnapshot [created - {self.created_at}]'
+
 
 class Digest(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
@@ -50,3 +252,35 @@ class Recipient(models.Model):
 
     def __str__(self):
         return f'Recipient [email - {self.email}, name - {self.name}]'
+
+
+class IngestRun(models.Model):
+    """
+    Results of one ArticlePipeline run of a news client: article
+    counts and the seconds, calls and items of every stage, see
+    stats.RunStats. Failed runs keep their error, and runs storing
+    old responses again (see replay_api_responses) are marked replay.
+    """
+    client = models.CharField(max_length=20)
+    started_at = models.DateTimeField()
+    duration = models.FloatField()
+    pages = models.PositiveIntegerField(default=0)
+    inserted = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    stages = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    replay = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', '-started_at'], name='ingestrun_client_started_idx'),
+        ]
+
+    def __str__(self):
+        return f'IngestRun [client - {self.client}, started - {self.started_at}]'
+
+    @property
+    def articles_per_second(self):
+        total = self.inserted + self.skipped + self.rejected
+        return total / self.duration if self.duration else 0
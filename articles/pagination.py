@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """
+    A page of results from KeysetPaginator. It supports iteration,
+    indexing and len() like a Django Page, plus opaque cursors to the
+    neighbouring pages.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.paginator = paginator
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor('next', self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor('previous', self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return self.paginator.encode_cursor('last')
+
+
+class KeysetPaginator:
+    """
+    This class implements seek pagination over a queryset ordered by
+    (published_at, id) descending.
+
+    Instead of counting every row and skipping to an offset, each page
+    starts right after the (published_at, id) key of the row before it,
+    which the index serves directly. Page N costs the same as page 1,
+    at the price of not knowing the page number or total pages.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def encode_cursor(self, direction, obj=None):
+        """
+        Return an opaque, url safe token for the page before or after
+        obj, or for the last page.
+        """
+        cursor = {'d': direction}
+        if obj is not None:
+            cursor.update({'p': obj.published_at.isoformat(), 'i': obj.id})
+        token = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+        return token.rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padding = '=' * (-len(token) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(token + padding))
+            direction = cursor['d']
+            if direction == 'last':
+                return direction, None, None
+            published_at = parse_datetime(cursor['p'])
+            pk = int(cursor['i'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor(token)
+
+        if direction not in ('next', 'previous') or published_at is None:
+            raise InvalidCursor(token)
+        return direction, published_at, pk
+
+    def page(self, cursor=None):
+        """
+        Return the KeysetPage for a cursor, or the first page if no
+        cursor is given. Raises InvalidCursor for malformed cursors.
+        """
+        if not cursor:
+            rows = list(self.queryset.order_by('-published_at', '-id')[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, False, self)
+
+        direction, published_at, pk = self.decode_cursor(cursor)
+
+        if direction == 'last':
+            rows = list(self.queryset.order_by('published_at', 'id')[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], False, has_previous, self)
+
+        if direction == 'next':
+            rows = list(self.queryset.filter(
+                Q(published_at__lt=published_at) | Q(published_at=published_at, id__lt=pk)
+            ).order_by('-published_at', '-id')[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, True, self)
+
+        rows = list(self.queryset.filter(
+            Q(published_at__gt=published_at) | Q(published_at=published_at, id__gt=pk)
+        ).order_by('published_at', 'id')[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page][::-1], True, len(rows) > self.per_page, self)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin paginating with KeysetPaginator, reading the page
+    cursor from the 'cursor' query parameter.
+    """
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
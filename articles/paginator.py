@@ -1,7 +1,6 @@
 from abc import ABCMeta, abstractmethod
 import logging
 import math
-from urllib import parse
 
 logger = logging.getLogger(__name__)
 
@@ -31,19 +30,18 @@ class BasePaginator(metaclass=ABCMeta):
     results.
     """
 
-    def _get_url_query_param(self, url, value):
+    def _get_url_query_param(self, value):
         """
-        Helper function to extract a query parameter (value) from a given url.
+        Helper function to extract a query parameter (value) from the url of
+        the stored response. The url is only parsed once per response.
 
         Args:
-            url (str): Url to parse
             value (str): Query paramter
 
         Returns:
             str: The value of query parameter
         """
-        url_parts = parse.parse_qs(parse.urlparse(url).query)
-        return url_parts.get(value)[0]
+        return self.response.query_params.get(value)[0]
 
     @abstractmethod
     def page_size(self):
@@ -131,19 +129,33 @@ class BasePaginator(metaclass=ABCMeta):
         """
         pass
 
+    @abstractmethod
+    def get_page_params(self, page):
+        """
+        This method should return the params required only to request a
+        given page, so pages can be requested out of order.
+
+        Args:
+            page (int): page number, starting at 1
+
+        Returns:
+            dict: key, val of query parameters for the page request
+        """
+        pass
+
 
 class BingPaginatorMixin(BasePaginator):
     @property
     def offset(self):
-        return int(self._get_url_query_param(self.response_url, 'offset'))
+        return int(self._get_url_query_param('offset'))
 
     @property
     def page_size(self):
-        return int(self._get_url_query_param(self.response_url, 'count'))
+        return int(self._get_url_query_param('count'))
 
     @property
     def total_results(self):
-        return self.response.json()['totalEstimatedMatches']
+        return self.response.data['totalEstimatedMatches']
 
     @property
     def current_page(self):
@@ -152,19 +164,25 @@ class BingPaginatorMixin(BasePaginator):
     def get_next_params(self):
         return {'offset': self.offset + self.page_size}
 
+    def get_page_params(self, page):
+        return {'offset': (page - 1) * self.page_size}
+
 
 class NewsApiPaginatorMixin(BasePaginator):
     @property
     def page_size(self):
-        return int(self._get_url_query_param(self.response_url, 'pageSize'))
+        return int(self._get_url_query_param('pageSize'))
 
     @property
     def total_results(self):
-        return self.response.json()['totalResults']
+        return self.response.data['totalResults']
 
     @property
     def current_page(self):
-        return int(self._get_url_query_param(self.response_url, 'page'))
+        return int(self._get_url_query_param('page'))
 
     def get_next_params(self):
         return {'page': self.current_page + 1}
+
+    def get_page_params(self, page):
+        return {'page': page}
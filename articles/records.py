@@ -0,0 +1,35 @@
+class SourceRecord:
+    """
+    A news source as serialized by a news client, before validation.
+    """
+    __slots__ = ('name', 'slug')
+
+    def __init__(self, name='', slug=''):
+        self.name = name
+        self.slug = slug
+
+    def __repr__(self):
+        return f'SourceRecord(name={self.name!r}, slug={self.slug!r})'
+
+
+class ArticleRecord:
+    """
+    An article as serialized by a news client, before validation.
+
+    News clients yield (ArticleRecord, SourceRecord) pairs and the
+    ArticlePipeline reads them. __slots__ keeps each record a fraction
+    of the size of the dict it replaces, which adds up on large replays.
+    """
+    __slots__ = ('author', 'title', 'description', 'url', 'image_url', 'published_at')
+
+    def __init__(self, title='', url='', published_at=None, author='', description='',
+                 image_url=''):
+        self.title = title
+        self.url = url
+        self.published_at = published_at
+        self.author = author
+        self.description = description
+        self.image_url = image_url
+
+    def __repr__(self):
+        return f'ArticleRecord(title={self.title!r}, url={self.url!r})'
@@ -0,0 +1,148 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'articles_article_fts'
+
+TOKEN_RE = re.compile(r'\w+')
+
+CREATE_TABLE_SQL = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    title, description, author, source_name,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+'''
+
+INSERT_ROW_SQL = f'''
+INSERT INTO {FTS_TABLE}(rowid, title, description, author, source_name)
+VALUES (
+    new.id, new.title, new.description, new.author,
+    (SELECT name FROM articles_source WHERE id = new.source_id)
+);
+'''
+
+# Triggers keep the index in sync with every write to the article and
+# source tables, including bulk inserts.
+CREATE_TRIGGERS_SQL = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON articles_article BEGIN
+        {INSERT_ROW_SQL}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON articles_article BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF title, description, author, source_id ON articles_article BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        {INSERT_ROW_SQL}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_source_update
+    AFTER UPDATE OF name ON articles_source BEGIN
+        UPDATE {FTS_TABLE} SET source_name = new.name
+        WHERE rowid IN (SELECT id FROM articles_article WHERE source_id = new.id);
+    END
+    ''',
+]
+
+REBUILD_SQL = [
+    f'DELETE FROM {FTS_TABLE}',
+    f'''
+    INSERT INTO {FTS_TABLE}(rowid, title, description, author, source_name)
+    SELECT article.id, article.title, article.description, article.author, source.name
+    FROM articles_article article
+    LEFT JOIN articles_source source ON source.id = article.source_id
+    ''',
+]
+
+
+def is_supported(db_connection=connection):
+    return db_connection.vendor == 'sqlite'
+
+
+def create_search_triggers(db_connection=connection):
+    """
+    (Re)create the triggers syncing the search index. SQLite drops them
+    whenever a migration rebuilds the article or source table, so this
+    also runs after every migrate.
+    """
+    if not is_supported(db_connection):
+        return
+    if FTS_TABLE not in db_connection.introspection.table_names():
+        return
+    with db_connection.cursor() as cursor:
+        for sql in CREATE_TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+def create_search_index(db_connection=connection):
+    """
+    Create the FTS5 index over article title, description, author and
+    source name, fill it with the stored articles and install the
+    triggers keeping it in sync.
+    """
+    if not is_supported(db_connection):
+        return
+    with db_connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+    create_search_triggers(db_connection)
+
+
+def drop_search_triggers(db_connection=connection):
+    """
+    Drop the triggers syncing the search index. SQLite refuses to
+    rebuild the article or source table while triggers reference it, so
+    migrations altering those tables run this first.
+    """
+    if not is_supported(db_connection):
+        return
+    with db_connection.cursor() as cursor:
+        for suffix in ('insert', 'delete', 'update', 'source_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+
+
+def drop_search_index(db_connection=connection):
+    if not is_supported(db_connection):
+        return
+    with db_connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    drop_search_triggers(db_connection)
+
+
+def get_match_query(query):
+    """
+    Turn user input into an FTS5 query matching articles with words
+    starting with every word of the input. Words are quoted so FTS5
+    syntax in the input is treated as text.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_filter(query):
+    """
+    Return a Q object filtering articles matching query, using the full
+    text index where the database supports it.
+    """
+    match_query = get_match_query(query)
+    if not is_supported() or not match_query:
+        return (
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(author__contains=query)
+        )
+
+    return Q(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_query]
+    ))
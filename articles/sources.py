@@ -0,0 +1,89 @@
+from collections import Counter
+import logging
+import threading
+
+from django.db import transaction
+
+from .models import Source
+
+logger = logging.getLogger(__name__)
+
+
+class SourceCache:
+    """
+    This class implements a process-wide, case-folded name to Source
+    cache, so resolving a known news outlet is a dict lookup instead
+    of a case-insensitive scan on the Source table.
+
+    Lookups and updates are guarded by a lock so the cache can be
+    shared by threads. Other processes (e.g. the huey worker and a
+    management command) may create sources at the same time, so a
+    miss always falls back to the database before a source is
+    considered new.
+
+    Sources are only cached once the transaction that found or
+    created them commits, so a page rolled back in batch mode leaves
+    no missing Source behind in the cache.
+    """
+
+    def __init__(self):
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._stats = Counter(hits=0, misses=0)
+
+    @staticmethod
+    def get_key(name):
+        return name.casefold()
+
+    def warm(self):
+        """
+        Load every stored source into the cache, replacing what is
+        there so sources deleted since the last warm are dropped.
+        """
+        sources = {self.get_key(source.name): source for source in Source.objects.all()}
+        with self._lock:
+            self._sources = sources
+        logger.info(f'Source cache warmed with {len(sources)} sources')
+
+    def add(self, source):
+        transaction.on_commit(lambda: self._add(source))
+
+    def _add(self, source):
+        with self._lock:
+            self._sources[self.get_key(source.name)] = source
+
+    def get(self, name, stats=None):
+        """
+        Return the Source matching name (case-insensitive) or None.
+        Hits and misses are also counted on stats, a Counter, if given,
+        e.g. to count them for a single run.
+        """
+        key = self.get_key(name)
+        with self._lock:
+            source = self._sources.get(key)
+            self._stats['hits' if source else 'misses'] += 1
+        if stats is not None:
+            stats['hits' if source else 'misses'] += 1
+
+        if source:
+            return source
+
+        source = Source.objects.filter(name__iexact=name).first()
+        if source:
+            self.add(source)
+        return source
+
+    def stats(self):
+        """
+        Return a copy of the process-wide hit and miss counters.
+        """
+        with self._lock:
+            return Counter(self._stats)
+
+    @staticmethod
+    def hit_rate(stats):
+        lookups = stats['hits'] + stats['misses']
+        return stats['hits'] / lookups if lookups else 0.0
+
+
+source_cache = SourceCache()
@@ -0,0 +1,71 @@
+from collections import Counter
+from contextlib import contextmanager
+import threading
+import time
+
+from django.utils import timezone
+
+
+class RunStats:
+    """
+    This class collects the time spent and the number of items handled
+    in each stage of an ingest run (http, json_decode, serialize,
+    duplicate_check, ...).
+
+    Pages are fetched on several threads, so updates are guarded by a
+    lock. Stage times from different threads are summed, so the time
+    of a stage may exceed the wall clock duration of the run.
+
+    source_cache counts the run's source cache hits and misses, see
+    SourceCache.get. Sources are only looked up by the thread storing
+    the run's pages.
+    """
+
+    def __init__(self):
+        self.started_at = timezone.now()
+        self._start = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self.source_cache = Counter(hits=0, misses=0)
+
+    def add(self, name, seconds, items=0):
+        with self._lock:
+            stage = self._stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'items': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+            stage['items'] += items
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """
+        Time the block as one call of a stage. The number of items
+        handled can be given upfront or set on the yielded dict.
+        """
+        stage = {'items': items}
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            self.add(name, time.perf_counter() - start, stage['items'])
+
+    def duration(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        """
+        Return a dict of stage name to its seconds, calls, items and
+        items per second.
+        """
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        for stage in stages.values():
+            seconds = stage['seconds']
+            stage['items_per_second'] = round(stage['items'] / seconds, 1) if seconds else None
+            stage['seconds'] = round(seconds, 4)
+        return stages
+
+    def format(self):
+        return ', '.join(
+            f'{name} {stage["seconds"]:.2f}s/{stage["items"]} items'
+            for name, stage in self.summary().items()
+        )
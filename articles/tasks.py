@@ -1,29 +1,23 @@
+import asyncio
 import logging
 
 from huey import crontab
 from huey.contrib.djhuey import periodic_task
 
 
-from articles.actions import (
-    bing_pipeline, bing_default_params,
-    news_api_pipeline, newsapi_default_params
-)
+from articles.actions import fetch_and_save_all_articles
 
 logger = logging.getLogger(__name__)
 
 
-def fetch_bing_and_newsapi():
-    try:
-        bing_pipeline.fetch_and_save_articles(params=bing_default_params)
-    except Exception as e:
-        logger.error(str(e))
-
-    try:
-        news_api_pipeline.fetch_and_save_articles(params=newsapi_default_params)
-    except Exception as e:
-        logger.error(str(e))
+def fetch_all_concurrently():
+    """
+    Fetch from every registered client at the same time. Errors are
+    logged per client by fetch_and_save_all_articles.
+    """
+    asyncio.run(fetch_and_save_all_articles())
 
 
 @periodic_task(crontab(minute='1', hour='*/6'))
 def perform_fetch_and_store_articles():
-    fetch_bing_and_newsapi()
+    fetch_all_concurrently()
@@ -1,3 +1,982 @@
-from django.test import TestCase
+import datetime
+import asyncio
+import html
+import io
+import json
+import os
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import re
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.html import strip_tags
+import requests
+
+from .actions import ArticlePipeline, fetch_and_save_all_articles
+from .benchmark import PayloadAdapter, generate_articles, newsapi_payload, run_benchmarks
+from .clients import BingClient, NewsApiClient
+from .exceptions import DacaNewsException
+from .forms import ArticleForm, SourceForm
+from .front_page import build_front_page_snapshot, get_front_page
+from .metrics import FreshnessCollector
+from .models import (
+    ApiPayload, ApiResponse, Article, FetchWatermark, FrontPageSnapshot, IngestGeneration,
+    IngestRun, Source
+)
+from .records import ArticleRecord, SourceRecord
+from .sources import source_cache
+from .stats import RunStats
+from .utils import (
+    _memoized_strip_tags_and_format, _strip_tags_and_format, strip_tags_and_format,
+    truncate_in_middle
+)
+from .validators import article_validator, source_validator
+from .views import ArticleListView
+
+
+# A plan step reading every row of the article table without an index.
+FULL_SCAN_RE = re.compile(r'\bSCAN (TABLE )?articles_article\b(?! USING)')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryPlanTests(TestCase):
+    """
+    Run EXPLAIN QUERY PLAN on the article queries behind the views and
+    the pipeline, failing if any of them reads the whole article table.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sources = [Source.objects.create(name=f'source {i}', slug=f'source-{i}') for i in range(3)]
+        published_at = timezone.now()
+        for i in range(40):
+            Article.objects.create(
+                source=sources[i % 3],
+                title=f'DACA article {i}',
+                description=f'Description {i}',
+                url=f'https://example.com/{i}',
+                image_url=f'https://example.com/{i}.jpg' if i % 2 else '',
+                published_at=published_at - datetime.timedelta(hours=i),
+            )
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are checked on SQLite only')
+        # Render every page instead of serving it from IngestCacheMiddleware.
+        cache.clear()
+
+    def assertNoFullScan(self, queries):
+        article_queries = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'articles_article' in query['sql']
+        ]
+        self.assertTrue(article_queries)
+        for sql in article_queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            self.assertIsNone(FULL_SCAN_RE.search(plan), f'{sql}\n{plan}')
+
+    def assertViewUsesIndexes(self, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertNoFullScan(queries.captured_queries)
+        return response
+
+    def test_front_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            get_front_page()
+        self.assertNoFullScan(queries.captured_queries)
+        self.assertViewUsesIndexes('/')
+
+    def test_archive(self):
+        response = self.assertViewUsesIndexes('/archive/')
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertViewUsesIndexes('/archive/', {'cursor': next_cursor})
+
+    def test_search(self):
+        self.assertViewUsesIndexes('/search/')
+        self.assertViewUsesIndexes('/search/', {'q': 'daca'})
+        self.assertViewUsesIndexes('/search/', {'source': ['source 1']})
+        self.assertViewUsesIndexes('/search/', {'q': 'daca', 'source': ['source 1']})
+
+    def test_duplicate_check(self):
+        article = ArticleRecord(title='DACA article 3', published_at=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            ArticlePipeline.check_duplicate_article_diff_source_exist(article)
+        self.assertNoFullScan(queries.captured_queries)
+
+    def test_save_article_page(self):
+        page = [(
+            ArticleRecord(
+                title='New DACA article',
+                url='https://example.com/new',
+                published_at=timezone.now(),
+            ),
+            SourceRecord(name='source 1'),
+        )]
+        with CaptureQueriesContext(connection) as queries:
+            ArticlePipeline.save_article_page(page)
+        self.assertNoFullScan(queries.captured_queries)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IngestCacheTests(TransactionTestCase):
+    """
+    Cached pages are served until the ingest generation is bumped, then
+    served stale once while a background request renders them again.
+    """
+
+    def setUp(self):
+        if 'articles.middleware.IngestCacheMiddleware' not in settings.MIDDLEWARE:
+            self.skipTest('The page cache is only enabled with DEBUG=False')
+        cache.clear()
+        self.source = Source.objects.create(name='source', slug='source')
+        self.create_article('First DACA article')
+
+    def create_article(self, title):
+        return Article.objects.create(
+            source=self.source, title=title, url=f'https://example.com/{title}',
+            published_at=timezone.now()
+        )
+
+    def get(self, path, cache_status):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.cache_status, cache_status)
+        return response.content.decode()
+
+    @staticmethod
+    def wait_for_refresh():
+        for thread in threading.enumerate():
+            if thread.name == 'ingest-cache-refresh':
+                thread.join()
+
+    def test_stale_page_is_replaced(self):
+        self.assertIn('First DACA article', self.get('/archive/', 'miss'))
+        self.assertIn('First DACA article', self.get('/archive/', 'hit'))
+
+        self.create_article('Second DACA article')
+        IngestGeneration.bump()
+        self.assertNotIn('Second DACA article', self.get('/archive/', 'stale'))
+        self.wait_for_refresh()
+
+        self.assertIn('Second DACA article', self.get('/archive/', 'hit'))
+
+    def test_edits_invalidate_pages(self):
+        article = self.create_article('Second DACA article')
+        self.assertIn('Second DACA article', self.get('/archive/', 'miss'))
+
+        Article.objects.get(pk=article.pk).delete()
+        self.assertIn('Second DACA article', self.get('/archive/', 'stale'))
+        self.wait_for_refresh()
+        self.assertNotIn('Second DACA article', self.get('/archive/', 'hit'))
+
+    def test_ingest_bumps_once(self):
+        generation = IngestGeneration.current()
+        pipeline = ArticlePipeline(NewsApiClient())
+        pipeline.start_run()
+        page = [
+            (
+                ArticleRecord(
+                    title=f'Ingested DACA article {i}', url=f'https://example.com/ingested/{i}',
+                    published_at=timezone.now()
+                ),
+                SourceRecord(name=f'new source {i}'),
+            )
+            for i in range(3)
+        ]
+        pipeline.save_page(page)
+        self.assertEqual(IngestGeneration.current(), generation)
+        pipeline.finish_run()
+        self.assertEqual(IngestGeneration.current(), generation + 1)
+
+
+class FrontPageSnapshotTests(TestCase):
+    """
+    Saving or deleting articles outside of ingest runs, e.g. in the
+    admin, marks the front page stale, and the index builds it again.
+    """
+
+    def setUp(self):
+        self.source = Source.objects.create(name='source', slug='source')
+        self.first = self.create_article('First DACA article', hours_ago=2)
+        build_front_page_snapshot()
+
+    def create_article(self, title, hours_ago=0):
+        return Article.objects.create(
+            source=self.source, title=title, url=f'https://example.com/{title}',
+            image_url=f'https://example.com/{title}.jpg',
+            published_at=timezone.now() - datetime.timedelta(hours=hours_ago)
+        )
+
+    def get_lead_article(self):
+        response = ArticleListView.as_view()(RequestFactory().get('/'))
+        return response.context_data['lead_article']
+
+    def test_edits_rebuild_the_front_page(self):
+        self.assertEqual(self.get_lead_article(), self.first)
+
+        second = self.create_article('Second DACA article')
+        self.assertFalse(FrontPageSnapshot.objects.exists())
+        self.assertEqual(self.get_lead_article(), second)
+        self.assertEqual(FrontPageSnapshot.objects.get().featured_article_ids[0], second.pk)
+
+        second.delete()
+        self.assertEqual(self.get_lead_article(), self.first)
+
+    def test_ingest_keeps_the_snapshot_until_it_finishes(self):
+        with IngestGeneration.defer_bumps():
+            self.create_article('Second DACA article')
+        self.assertEqual(self.get_lead_article(), self.first)
+
+
+class SaveArticlePageTests(TestCase):
+    """
+    Batch mode stores a page with a handful of queries in a single
+    transaction.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sources = [
+            Source.objects.create(name=f'outlet {i}', slug=f'outlet-{i}') for i in range(25)
+        ]
+        cls.published_at = timezone.now()
+        Article.objects.create(
+            source=cls.sources[0], title='Stored DACA article', url='https://example.com/stored',
+            published_at=cls.published_at
+        )
+
+    def setUp(self):
+        source_cache.warm()
+
+    def make_page(self, count, source_names=None):
+        source_names = source_names or [source.name for source in self.sources]
+        return [
+            (
+                ArticleRecord(
+                    title=f'DACA article {i}',
+                    url=f'https://example.com/{i}',
+                    published_at=self.published_at - datetime.timedelta(minutes=i),
+                ),
+                SourceRecord(name=source_names[i % len(source_names)]),
+            )
+            for i in range(count)
+        ]
+
+    def test_query_budget(self):
+        page = self.make_page(100)
+        # Stored url, stored title and a duplicate url within the page.
+        page[1][0].url = 'https://example.com/stored'
+        page[2][0].title = 'Stored DACA article'
+        page[3][0].url = page[4][0].url
+        # Invalid url.
+        page[5][0].url = 'not a url'
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = ArticlePipeline.save_article_page(page)
+
+        self.assertEqual(counts, {'inserted': 96, 'skipped': 3, 'rejected': 1})
+        self.assertLess(len(queries), 10, '\n'.join(query['sql'] for query in queries))
+        self.assertEqual(
+            sum(Source.objects.values_list('article_count', flat=True)), Article.objects.count()
+        )
+
+    def test_double_escaped_title_duplicates_stored_title(self):
+        # Validation unescapes the raw title once before it is stored.
+        raw_title = 'Biden &amp;amp; DACA'
+        Article.objects.create(
+            source=self.sources[1], title=strip_tags_and_format(raw_title),
+            url='https://example.com/escaped', published_at=self.published_at
+        )
+        page = self.make_page(2)
+        page[0][0].title = raw_title
+
+        self.assertTrue(ArticlePipeline.check_duplicate_article_diff_source_exist(page[0][0]))
+        counts = ArticlePipeline.save_article_page(page)
+        self.assertEqual(counts, {'inserted': 1, 'skipped': 1, 'rejected': 0})
+
+    def test_rollback(self):
+        page = self.make_page(10, source_names=['brand new outlet', 'outlet 1'])
+        with mock.patch.object(Article.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                ArticlePipeline.save_article_page(page)
+
+        self.assertEqual(Article.objects.count(), 1)
+        self.assertFalse(Source.objects.filter(name='brand new outlet').exists())
+        self.assertEqual(Source.objects.get(name='outlet 1').article_count, 0)
+
+
+class SourceArticleCountTests(TestCase):
+    """
+    Source.article_count follows inserts, deletes and edits moving an
+    article to another source.
+    """
+
+    def setUp(self):
+        self.first = Source.objects.create(name='first', slug='first')
+        self.second = Source.objects.create(name='second', slug='second')
+
+    def assertCounts(self, first, second):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.article_count, self.second.article_count), (first, second))
+
+    def test_create_move_and_delete(self):
+        Article.objects.create(
+            source=self.first, title='DACA', url='https://example.com/a',
+            published_at=timezone.now()
+        )
+        self.assertCounts(1, 0)
+
+        article = Article.objects.get(url='https://example.com/a')
+        article.title = 'DACA edited'
+        article.save()
+        self.assertCounts(1, 0)
+
+        article.source = self.second
+        article.save()
+        self.assertCounts(0, 1)
+
+        Article.objects.get(pk=article.pk).delete()
+        self.assertCounts(0, 0)
+
+    def test_move_created_instance_and_delete(self):
+        article = Article.objects.create(
+            source=self.first, title='DACA', url='https://example.com/a',
+            published_at=timezone.now()
+        )
+        article.source = self.second
+        article.save()
+        self.assertCounts(0, 1)
+
+        article.delete()
+        self.assertCounts(0, 0)
+
+    def test_add_article_counts_is_one_query(self):
+        with self.assertNumQueries(1):
+            Source.add_article_counts({self.first.id: 3, self.second.id: 2})
+        self.assertCounts(3, 2)
+        with self.assertNumQueries(0):
+            Source.add_article_counts({self.first.id: 0})
+
+
+class SourceCacheTests(TransactionTestCase):
+    """
+    Sources are only cached once their transaction commits.
+    """
+
+    def setUp(self):
+        source_cache.warm()
+
+    def test_rolled_back_source_is_not_cached(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            source = ArticlePipeline.get_source(SourceRecord(name='New Outlet'))
+            self.assertIsNotNone(source.pk)
+            raise RuntimeError('page failed')
+
+        self.assertFalse(Source.objects.exists())
+        self.assertIsNone(source_cache.get('new outlet'))
+
+    def test_committed_source_is_cached(self):
+        with transaction.atomic():
+            source = ArticlePipeline.get_source(SourceRecord(name='New Outlet'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(source_cache.get('New Outlet'), source)
+
+    def test_hits_are_counted_per_run(self):
+        Source.objects.create(name='known outlet', slug='known-outlet')
+        source_cache.warm()
+        first, second = RunStats(), RunStats()
+        ArticlePipeline.get_source(SourceRecord(name='Known Outlet'), first)
+        ArticlePipeline.get_source(SourceRecord(name='New Outlet'), second)
+        ArticlePipeline.get_source(SourceRecord(name='New Outlet'), first)
+
+        self.assertEqual(first.source_cache, {'hits': 2, 'misses': 0})
+        self.assertEqual(second.source_cache, {'hits': 0, 'misses': 1})
+
+
+class RecordValidatorTests(TestCase):
+    """
+    Compare article_validator and source_validator with the forms they
+    replaced, ArticleForm and SourceForm.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.source = Source.objects.create(name='stored outlet', slug='stored-slug')
+        Article.objects.create(
+            source=cls.source, title='Stored DACA article', url='https://example.com/stored',
+            published_at=timezone.now()
+        )
+
+    def article_records(self):
+        now = timezone.now()
+        yield ArticleRecord(title='DACA', url='https://example.com/a', published_at=now)
+        yield ArticleRecord(
+            title='  <b>DACA</b> &amp; Dreamers ', url='https://example.com/b',
+            published_at='2020-06-18 10:00', author='<p>Reporter</p>',
+            description='Court &lt;ruling&gt;', image_url='https://example.com/th?id=1&pid=News'
+        )
+        yield ArticleRecord(title='<b></b>', url='https://example.com/c', published_at=now)
+        yield ArticleRecord(title='', url='', published_at=None)
+        yield ArticleRecord(title='DACA', url='not a url', published_at='garbage')
+        yield ArticleRecord(title='DACA', url='example.com/d', published_at=now)
+        yield ArticleRecord(title='x' * 600, url='https://example.com/e', published_at=now)
+        yield ArticleRecord(title='DACA', url='https://example.com/stored', published_at=now)
+        yield ArticleRecord(
+            title='DACA', url='https://example.com/f', published_at=now, author='x' * 501,
+            image_url='bad url'
+        )
+
+    def source_records(self):
+        # SourceForm.clean raises KeyError when name or slug don't validate,
+        # so only records with valid fields are compared.
+        yield SourceRecord(name='Fox News')
+        yield SourceRecord(name='<b>CNN</b>', slug='cnn')
+        yield SourceRecord(name='Stored Outlet')
+        yield SourceRecord(name='new outlet', slug='stored-slug')
+        yield SourceRecord(name='a name long enough to slugify past the fifty chars of a slug')
+
+    def assertMatchesForm(self, form, instance, errors, fields):
+        self.assertEqual(form.is_valid(), not errors, form.errors.as_data())
+        if errors:
+            self.assertEqual(
+                {name: [e.code for e in error_list] for name, error_list in errors.items()},
+                {
+                    name: [e.code for e in error_list]
+                    for name, error_list in form.errors.as_data().items()
+                },
+            )
+            return
+        for name in fields:
+            self.assertEqual(getattr(instance, name), getattr(form.instance, name), name)
+
+    def test_article_validator_matches_article_form(self):
+        for record in self.article_records():
+            with self.subTest(record=record):
+                data = {name: getattr(record, name) for name in record.__slots__}
+                form = ArticleForm({**data, 'source': self.source.id})
+                instance, errors = article_validator.build(record, source=self.source)
+                self.assertMatchesForm(form, instance, errors, article_validator.fields)
+
+    def test_source_validator_matches_source_form(self):
+        for record in self.source_records():
+            with self.subTest(record=record):
+                form = SourceForm({name: getattr(record, name) for name in record.__slots__})
+                instance, errors = source_validator.build(record)
+                self.assertMatchesForm(form, instance, errors, source_validator.fields)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BenchmarkTests(TestCase):
+    """
+    The benchmarks run on a small dataset and count the queries of
+    every benchmark, including the pipeline runs.
+    """
+
+    def test_run_benchmarks(self):
+        generate_articles(50, source_count=5)
+        results = run_benchmarks(repeat=1)
+        self.assertGreater(results['index']['queries'], 0)
+        for name in (
+            'newsapi_fetch_and_save_500', 'newsapi_fetch_and_save_500_batch',
+            'bing_fetch_and_save_100_batch'
+        ):
+            self.assertGreater(results[name]['queries'], 0, name)
+
+
+class SlowPayloadAdapter(PayloadAdapter):
+    """
+    PayloadAdapter taking latency seconds per request and keeping the
+    most requests seen in flight at once.
+    """
+    latency = 0.05
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.requested.append(request.url)
+        try:
+            time.sleep(self.latency)
+            return super().send(request, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class ClientPaginationTests(SimpleTestCase):
+    """
+    Pages after the first are fetched concurrently, and still yielded
+    in page order.
+    """
+    params = {'q': 'daca', 'pageSize': 100, 'page': 1}
+
+    def fetch_pages(self, total=1000, **params):
+        client = NewsApiClient()
+        adapter = SlowPayloadAdapter(client, total)
+        client.session.mount('https://', adapter)
+        pages = [
+            int(response.query_params['page'][0])
+            for response, _ in client.fetch_pages({**self.params, **params})
+        ]
+        return pages, adapter
+
+    def test_concurrent_pages_in_order(self):
+        with self.settings(NEWS_CLIENT_MAX_WORKERS=4):
+            pages, adapter = self.fetch_pages()
+        self.assertEqual(pages, list(range(1, 11)))
+        self.assertEqual(adapter.max_in_flight, 4)
+
+    def test_sequential_pages(self):
+        pages, adapter = self.fetch_pages(max_workers=1)
+        self.assertEqual(pages, list(range(1, 11)))
+        self.assertEqual(adapter.max_in_flight, 1)
+
+    def test_max_pages(self):
+        pages, adapter = self.fetch_pages(max_pages=3, max_workers=4)
+        self.assertEqual(pages, [1, 2, 3])
+        self.assertEqual(len(adapter.requested), 3)
+
+
+class StalePayloadAdapter(SlowPayloadAdapter):
+    """
+    SlowPayloadAdapter dating the articles of every page after the
+    first a day back.
+    """
+    latency = 0
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if 'page=1&' not in f'{request.url}&':
+            payload = json.loads(response.content)
+            published_at = timezone.now() - datetime.timedelta(days=1)
+            for article in payload['articles']:
+                article['publishedAt'] = published_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+            response._content = json.dumps(payload).encode()
+        return response
+
+
+class WatermarkTests(TestCase):
+    """
+    Incremental runs stop paginating at the first page made up
+    entirely of articles behind the client's watermark.
+    """
+    params = {'q': 'daca', 'pageSize': 100, 'page': 1}
+
+    def fetch(self, watermark_delta, adapter_class=SlowPayloadAdapter, **params):
+        FetchWatermark.objects.create(
+            client='NewsAPI', published_at=timezone.now() + watermark_delta, urls=[]
+        )
+        client = NewsApiClient()
+        adapter = adapter_class(client, 1000)
+        adapter.latency = 0
+        client.session.mount('https://', adapter)
+        ArticlePipeline(client).fetch_and_save_articles(
+            {**self.params, **params}, batch=True, incremental=True, prefetch=0
+        )
+        return adapter.requested
+
+    def test_known_page_stops_pagination(self):
+        self.assertEqual(len(self.fetch(datetime.timedelta(hours=1))), 1)
+
+    def test_known_second_page_stops_concurrent_pagination(self):
+        requested = self.fetch(
+            -datetime.timedelta(hours=1), StalePayloadAdapter, max_workers=1
+        )
+        self.assertEqual(len(requested), 2)
+        Article.objects.all().delete()
+        FetchWatermark.objects.all().delete()
+        # Only max_workers pages are requested ahead of the known one.
+        requested = self.fetch(
+            -datetime.timedelta(hours=1), StalePayloadAdapter, max_workers=3
+        )
+        self.assertLessEqual(len(requested), 1 + 3)
+
+    def test_new_pages_paginate(self):
+        self.assertEqual(len(self.fetch(-datetime.timedelta(hours=1))), 10)
+        watermark = FetchWatermark.objects.get(client='NewsAPI')
+        self.assertGreater(watermark.published_at, timezone.now() - datetime.timedelta(hours=1))
+
+
+class ReplayApiResponsesTests(TestCase):
+    """
+    replay_api_responses stores the articles of stored responses and
+    of JSONL dumps again.
+    """
+
+    def replay(self, *args):
+        call_command('replay_api_responses', *args, stdout=io.StringIO())
+
+    def test_stored_responses(self):
+        client = NewsApiClient()
+        adapter = SlowPayloadAdapter(client, 300)
+        adapter.latency = 0
+        client.session.mount('https://', adapter)
+        ArticlePipeline(client).fetch_and_save_articles(
+            {'q': 'daca', 'pageSize': 100, 'page': 1}, batch=True, prefetch=0
+        )
+        self.assertEqual(ApiResponse.objects.count(), 3)
+        Article.objects.all().delete()
+
+        self.replay('--client', 'NewsApi', '--batch', '--chunk-size', '2')
+        self.assertEqual(Article.objects.count(), 300)
+
+    def test_jsonl(self):
+        rng = random.Random(0)
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as jsonl:
+            for page in (1, 2):
+                jsonl.write(json.dumps(newsapi_payload(rng, page, 100, 200, 'jsonl')) + '\n\n')
+        self.addCleanup(os.remove, jsonl.name)
+
+        self.replay('--client', 'NewsApi', '--jsonl', jsonl.name)
+        self.assertEqual(Article.objects.count(), 200)
+        self.assertFalse(ApiResponse.objects.exists())
+
+        # Replays of old data don't move the watermark or count as runs
+        # of the live client.
+        self.assertFalse(FetchWatermark.objects.exists())
+        self.assertTrue(IngestRun.objects.get().replay)
+        run_age = list(FreshnessCollector().collect())[1]
+        self.assertEqual(run_age.samples, [])
+
+
+class CompactApiResponsesTests(TestCase):
+    """
+    compact_api_responses moves legacy bodies into deduplicated
+    payloads and removes unused payloads.
+    """
+
+    def test_compact(self):
+        bodies = [{'articles': [], 'page': page % 3} for page in range(7)]
+        for body in bodies:
+            ApiResponse.objects.create(source='NewsAPI', response=body)
+        ArticlePipeline.create_api_payload(b'{"unused": true}')
+
+        call_command('compact_api_responses', '--no-vacuum', stdout=io.StringIO())
+
+        self.assertFalse(ApiResponse.objects.filter(payload__isnull=True).exists())
+        self.assertEqual(
+            sorted(response.get_response()['page'] for response in ApiResponse.objects.all()),
+            sorted(body['page'] for body in bodies)
+        )
+        self.assertEqual(ApiPayload.objects.count(), 3)
+
+
+class SlowFailingHandler(BaseHTTPRequestHandler):
+    """
+    Answer every request with a 503 after server.latency seconds.
+    """
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(NEWS_CLIENT_MAX_RETRIES=3, NEWS_CLIENT_BACKOFF_FACTOR=0.5)
+class ClientDeadlineTests(SimpleTestCase):
+    """
+    A run against a slow, failing upstream ends by its deadline,
+    retries included.
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SlowFailingHandler)
+        self.server.requests = 0
+        self.server.latency = 0.2
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def fetch(self, deadline, timeout=(5, 30)):
+        client = NewsApiClient()
+        client.base_url = f'http://127.0.0.1:{self.server.server_port}/v2'
+        client.timeout = timeout
+        start = time.monotonic()
+        with self.assertRaises(requests.exceptions.RequestException):
+            list(client.fetch_pages({'q': 'daca', 'deadline': deadline}))
+        return time.monotonic() - start
+
+    def test_retries_within_deadline(self):
+        # Attempts may take 0.5 seconds. The backoffs are 0 and 1 second,
+        # so a fourth attempt after a 2 second backoff would not fit.
+        elapsed = self.fetch(deadline=2, timeout=(0.2, 0.3))
+        self.assertLess(elapsed, 2)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_no_retry_near_deadline(self):
+        elapsed = self.fetch(deadline=2)
+        self.assertLess(elapsed, 2)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_slow_response_within_deadline(self):
+        self.server.latency = 1.5
+        elapsed = self.fetch(deadline=0.5)
+        self.assertLess(elapsed, 1)
+
+    @override_settings(NEWS_CLIENT_BACKOFF_FACTOR=0.01)
+    def test_retries_without_deadline(self):
+        self.server.latency = 0
+        self.fetch(deadline=None, timeout=(0.2, 0.3))
+        self.assertEqual(self.server.requests, 4)
+
+
+class FailingPayloadAdapter(SlowPayloadAdapter):
+    """
+    SlowPayloadAdapter failing to connect for requests of fail_page.
+    """
+    latency = 0.01
+    fail_page = 3
+
+    def send(self, request, **kwargs):
+        if f'page={self.fail_page}&' in f'{request.url}&':
+            raise requests.exceptions.ConnectionError('connection refused')
+        return super().send(request, **kwargs)
+
+
+class IngestEngineTests(TransactionTestCase):
+    """
+    Pipelined runs fetch the next pages while storing the current one,
+    and stop cleanly, without leaving threads behind, on errors.
+    """
+    # Fetch pages one at a time, so a failed run stops fetching early.
+    params = {'q': 'daca', 'pageSize': 100, 'page': 1, 'max_workers': 1}
+
+    def setUp(self):
+        self.threads = set(threading.enumerate())
+
+    def tearDown(self):
+        self.assertFalse(set(threading.enumerate()) - self.threads)
+
+    def get_pipeline(self, adapter_class=FailingPayloadAdapter, client_class=NewsApiClient,
+                     total=1000):
+        client = client_class()
+        self.adapter = adapter_class(client, total)
+        client.session.mount('https://', self.adapter)
+        return ArticlePipeline(client)
+
+    def test_prefetch(self):
+        pipeline = self.get_pipeline(SlowPayloadAdapter, total=500)
+        counts = pipeline.fetch_and_save_articles(self.params, batch=True, prefetch=2)
+        self.assertEqual(counts, {'inserted': 500, 'skipped': 0, 'rejected': 0})
+        self.assertEqual(Article.objects.count(), 500)
+        self.assertEqual(IngestRun.objects.get().pages, 5)
+
+    def test_slow_store_bounds_fetching(self):
+        pipeline = self.get_pipeline(SlowPayloadAdapter, total=2000)
+        save_page = pipeline.save_page
+        requested = []
+
+        def slow_save_page(page, *args):
+            requested.append(len(self.adapter.requested))
+            time.sleep(0.2)
+            save_page(page, *args)
+
+        pipeline.save_page = slow_save_page
+        pipeline.fetch_and_save_articles(
+            {**self.params, 'max_workers': 4}, batch=True, prefetch=1
+        )
+        # While the second page is stored, one page is queued, one waits
+        # to be queued and max_workers pages are requested ahead.
+        self.assertLessEqual(requested[1], 2 + 1 + 1 + 4)
+        self.assertEqual(len(self.adapter.requested), 20)
+
+    def test_fetch_error(self):
+        pipeline = self.get_pipeline()
+        with self.assertRaises(DacaNewsException):
+            pipeline.fetch_and_save_articles(self.params, batch=True, prefetch=2)
+        self.assertEqual(Article.objects.count(), 200)
+        self.assertIn('connection refused', IngestRun.objects.get().error)
+
+    def test_store_error_stops_fetching(self):
+        pipeline = self.get_pipeline()
+        self.adapter.fail_page = None
+        save_page = pipeline.save_page
+
+        def fail_second_page(page, *args):
+            if pipeline.pages == 1:
+                raise ValueError('database is locked')
+            save_page(page, *args)
+
+        pipeline.save_page = fail_second_page
+        with self.assertRaises(DacaNewsException):
+            pipeline.fetch_and_save_articles(self.params, batch=True, prefetch=1)
+        self.assertEqual(Article.objects.count(), 100)
+        self.assertIn('database is locked', IngestRun.objects.get().error)
+        # The queue holds one page, so fetching stopped soon after the error.
+        self.assertLessEqual(len(self.adapter.requested), 5)
+
+    def test_client_errors_are_isolated(self):
+        failing = self.get_pipeline()
+        self.adapter.fail_page = 1
+        working = self.get_pipeline(SlowPayloadAdapter, BingClient, total=300)
+        results = asyncio.run(fetch_and_save_all_articles([
+            (failing, self.params),
+            (working, {'q': 'daca', 'count': 100, 'offset': 0, 'max_workers': 1}),
+        ]))
+        self.assertIsInstance(results[failing], requests.exceptions.ConnectionError)
+        self.assertEqual(results[working]['inserted'] + results[working]['skipped'], 300)
+        self.assertEqual(IngestRun.objects.filter(error='').get().client, 'Bing')
+
+
+class StripTagsAndFormatTests(SimpleTestCase):
+    """
+    Compare strip_tags_and_format with the implementation it replaced,
+    strip_tags(html.unescape(value)), on headlines and on random markup.
+    """
+    corpus = [
+        '',
+        'DACA recipients win in court',
+        'DACA recipients &amp; <b>Dreamers</b> win in court',
+        'Trump&#8217;s plan for DACA &quot;ends&quot; today',
+        'Supreme Court &lt;b&gt;blocks&lt;/b&gt; DACA repeal',
+        'AT&T and <i>Q&A</i> about DACA',
+        '<a href="https://example.com/?a=1&amp;b=2" target=_blank>Read more</a>',
+        "<img src='https://example.com/a.jpg' alt=\"DACA\"/>Caption",
+        '<p class="lead">First<br>second<br />third</p>',
+        '<script>alert("x")</script>Title',
+        '<style>p { color: red }</style>Title',
+        'Title <!-- comment --> text',
+        '5 < 6 and 7 > 3',
+        '<<b>b>nested</b>',
+        'Trailing &',
+        'Unclosed <b',
+        '</ b>Odd end tag',
+        '<my-tag>Custom</my-tag>',
+    ]
+    markup = [
+        '<b>', '</b>', '<a href="https://example.com/?a=1&b=2">', '</a>', '<br/>', '<br />',
+        '<p class=lead>', '<!-- c -->', '<script>', '</script>', '&amp;', '&lt;', '&gt;',
+        '&#39;', '&nbsp;', 'AT&T', ' ', 'DACA', '<', '>', '&', '<3', '\n', 'é', '&lt;i&gt;',
+    ]
+
+    def assertSameAsStripTags(self, value):
+        self.assertEqual(
+            _strip_tags_and_format(value), strip_tags(html.unescape(value)), value
+        )
+
+    def test_corpus(self):
+        for value in self.corpus:
+            self.assertSameAsStripTags(value)
+
+    def test_random_markup(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            value = ''.join(rng.choice(self.markup) for _ in range(rng.randint(0, 12)))
+            self.assertSameAsStripTags(value)
+
+    def test_random_characters(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            value = ''.join(rng.choice('<>/ab &;#x1"=\'!-') for _ in range(rng.randint(0, 15)))
+            self.assertSameAsStripTags(value)
+
+    def test_only_short_strings_are_memoized(self):
+        title = '<b>DACA</b> title'
+        description = '<p>' + 'DACA description ' * 100 + '</p>'
+        with mock.patch(
+            'articles.utils._strip_tags_and_format', wraps=_strip_tags_and_format
+        ) as uncached:
+            for _ in range(3):
+                self.assertEqual(strip_tags_and_format(description), strip_tags(description))
+        self.assertEqual(uncached.call_count, 3)
+
+        strip_tags_and_format(title)
+        hits = _memoized_strip_tags_and_format.cache_info().hits
+        self.assertEqual(strip_tags_and_format(title), 'DACA title')
+        self.assertEqual(_memoized_strip_tags_and_format.cache_info().hits, hits + 1)
+
+
+def truncate_in_middle_reference(value, max_length):
+    """
+    The implementation truncate_in_middle replaced, from the
+    truncate_in_middle template tag, with its hard-coded 70 replaced
+    by max_length.
+    """
+    if len(value) <= max_length:
+        return value
+
+    words = value.split()
+
+    while True:
+        if len(words) == 1:
+            return words[0][:max_length - 3] + '...'
+
+        mid = len(words) // 2
+        value = ' '.join(words[0:mid]) + '...' + ' '.join(words[mid + 1:])
+        del words[mid]
+
+        if len(value) <= max_length:
+            break
+
+    return value
+
+
+class TruncateInMiddleTests(SimpleTestCase):
+    """
+    Compare truncate_in_middle with the implementation it replaced on
+    headlines and on random titles.
+    """
+    corpus = [
+        '',
+        'DACA',
+        'Supreme Court blocks Trump from ending DACA, a win for Dreamers',
+        'Supreme Court blocks Trump administration from ending DACA program in a '
+        'major win for hundreds of thousands of Dreamers',
+        'Antidisestablishmentarianism' * 4,
+        'Short ' + 'Antidisestablishmentarianism' * 4,
+        'Antidisestablishmentarianism' * 4 + ' end',
+        '  Leading   and   repeated   whitespace   in   a   title   '
+        'long   enough   to   be   cut  ',
+    ]
+
+    def assertSameAsReference(self, value, max_length):
+        self.assertEqual(
+            truncate_in_middle.__wrapped__(value, max_length),
+            truncate_in_middle_reference(value, max_length),
+            (value, max_length)
+        )
+
+    def test_corpus(self):
+        for value in self.corpus:
+            for max_length in (10, 40, 70):
+                self.assertSameAsReference(value, max_length)
+
+    def test_random_titles(self):
+        rng = random.Random(0)
+        for _ in range(20000):
+            words = [
+                ''.join(rng.choice('abcdefg') for _ in range(rng.randint(1, 15)))
+                for _ in range(rng.randint(1, 40))
+            ]
+            value = rng.choice([' ', '  ']).join(words)
+            self.assertSameAsReference(value, rng.choice((20, 40, 70, 100)))
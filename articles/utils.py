@@ -0,0 +1,190 @@
+from collections import defaultdict
+from functools import lru_cache
+import html
+import re
+import time
+
+from django.utils.html import strip_tags
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+# A start or end tag with a plain name and optional attributes, which
+# Django's strip_tags would remove as is.
+SIMPLE_TAG_RE = re.compile(r"""
+    </?[a-zA-Z][a-zA-Z0-9]*
+    (?:\s+[^\s<>"'=/]+(?:\s*=\s*(?:"[^"<>]*"|'[^'<>]*'|[^\s"'<>=`]+))?)*
+    \s*/?>
+""", re.VERBOSE)
+
+# HTMLParser keeps the content of these tags as raw text.
+RAW_TEXT_TAG_RE = re.compile(r'<(?:script|style)', re.IGNORECASE)
+
+# HTMLParser rewrites an '&' starting something like an entity, e.g.
+# "AT&T " becomes "AT&T; ".
+ENTITY_LIKE_RE = re.compile(r'&[a-zA-Z#]')
+
+# Longest string strip_tags_and_format memoizes, enough for titles and
+# source names.
+MAX_MEMOIZED_LENGTH = 300
+
+
+def _strip_tags_and_format(html_str):
+    """
+    Unescape HTML entities and strip tags, with the same output as
+    django.utils.html.strip_tags(html.unescape(html_str)).
+
+    strip_tags runs an HTMLParser until the output stops changing, so
+    text without tags is returned as is and simple tags are removed
+    with a regex. Anything else, e.g. comments, script tags or an '&'
+    next to tags that looks like an entity, which HTMLParser rewrites,
+    still goes through strip_tags.
+    """
+    if '&' in html_str:
+        html_str = html.unescape(html_str)
+    if '<' not in html_str or '>' not in html_str:
+        return html_str
+
+    if not ENTITY_LIKE_RE.search(html_str) and not RAW_TEXT_TAG_RE.search(html_str):
+        stripped = SIMPLE_TAG_RE.sub('', html_str)
+        if '<' not in stripped:
+            return stripped
+    return strip_tags(html_str)
+
+
+_memoized_strip_tags_and_format = lru_cache(maxsize=8192)(_strip_tags_and_format)
+
+
+def strip_tags_and_format(html_str):
+    """
+    Unescape HTML entities and strip tags, see _strip_tags_and_format.
+
+    Strings up to MAX_MEMOIZED_LENGTH are memoized, as the same titles
+    and source names are cleaned several times during ingest. Longer
+    strings, mostly unique descriptions, would only fill the cache.
+    """
+    if len(html_str) > MAX_MEMOIZED_LENGTH:
+        return _strip_tags_and_format(html_str)
+    return _memoized_strip_tags_and_format(html_str)
+
+
+def normalize_title(title):
+    """
+    Return the key used to compare article titles across sources:
+    tags stripped, case-folded, and runs of whitespace and punctuation
+    collapsed into a single space.
+    """
+    title = strip_tags_and_format(title or '').casefold()
+    return NON_WORD_RE.sub(' ', title).strip()[:500]
+
+
+def _joined_length(offsets, start, end):
+    """
+    Return the length of ' '.join(words[start:end]), given the prefix
+    sums of the word lengths.
+    """
+    if start >= end:
+        return 0
+    return offsets[end] - offsets[start] + end - start - 1
+
+
+def _middle_block(words, max_length):
+    """
+    Return (start, end) of the block of middle words to remove so the
+    words left, with an ellipsis where the block was, fit max_length,
+    or so that a single word is left.
+
+    Middle words are removed one at a time. The removed words always
+    form one contiguous block, so the length of the result is computed
+    from prefix sums of the word lengths instead of joining the words
+    after every removal.
+    """
+    # offsets[i] is the length of the first i words, without spaces.
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+
+    count = len(words)
+    start = end = count // 2
+    while count - (end - start) > 1:
+        # Remove the middle word of the remaining ones, which is next
+        # to the removed block.
+        if (count - (end - start)) // 2 < start:
+            start -= 1
+        else:
+            end += 1
+
+        # Check length with the ellipsis
+        length = _joined_length(offsets, 0, start) + 3 + _joined_length(offsets, end, count)
+        if length <= max_length:
+            break
+    return start, end
+
+
+@lru_cache(maxsize=4096)
+def truncate_in_middle(value, max_length):
+    """
+    Truncate text in the middle by words.
+    If the text is longer than the max_length, remove middle words
+    until the text, with an ellipsis where the words were, is less
+    than or equal to max_length, see _middle_block.
+    """
+    if len(value) <= max_length:
+        return value
+
+    words = value.split()
+    if not words:
+        return value[:max_length - 3] + '...'
+
+    start, end = _middle_block(words, max_length)
+    if end - start == len(words) - 1:
+        # Base case, a single word is left.
+        word = words[0] if start else words[end]
+        return word[:max_length - 3] + '...'
+    return ' '.join(words[:start]) + '...' + ' '.join(words[end:])
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run while installed.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper timing the queries run while installed,
+    grouped by SQL so repeated (N+1) queries stand out.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.queries[sql][0] += 1
+            self.queries[sql][1] += duration
+
+    def most_repeated(self, limit=5):
+        """
+        Return the limit most often run queries as dicts of sql, count
+        and time_ms.
+        """
+        queries = sorted(self.queries.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            {'sql': sql, 'count': count, 'time_ms': round(duration * 1000, 3)}
+            for sql, (count, duration) in queries[:limit]
+        ]
@@ -0,0 +1,162 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.template.defaultfilters import slugify
+
+from .models import Article, Source
+from .utils import strip_tags_and_format
+
+
+class RecordValidator:
+    """
+    This class validates and normalizes records (see records.py) with
+    the rules of a ModelForm, without building a form for every record.
+
+    The model's form fields are created once and reused, each value is
+    cleaned by its form field and then by the clean_<field> hook, like
+    a ModelForm does. Errors are returned in the shape of
+    form.errors.as_data(), so they log the same way.
+    """
+    model = None
+    fields = ()
+    unique_fields = ()
+
+    def __init__(self):
+        self.model_fields = {name: self.model._meta.get_field(name) for name in self.fields}
+        self.form_fields = {
+            name: model_field.formfield() for name, model_field in self.model_fields.items()
+        }
+
+    def clean(self, record):
+        """
+        Return (cleaned_data, errors) for a record. Fields the record
+        doesn't have are cleaned as None, like values missing from a
+        form's data.
+        """
+        cleaned_data = {}
+        errors = {}
+        for name in self.form_fields:
+            try:
+                cleaned_data[name] = self.clean_field(name, getattr(record, name, None))
+            except ValidationError as e:
+                errors[name] = e.error_list
+
+        if not errors:
+            self.clean_record(cleaned_data, errors)
+        return cleaned_data, errors
+
+    def clean_field(self, name, value):
+        """
+        Clean a value with its form field and clean_<name> hook, and
+        raise ValidationError if it doesn't validate.
+        """
+        value = self.form_fields[name].clean(value)
+        hook = getattr(self, f'clean_{name}', None)
+        if hook:
+            value = hook(value)
+
+        # The model rejects values the hooks emptied, e.g. a title
+        # made only of tags.
+        model_field = self.model_fields[name]
+        if not model_field.blank and value in model_field.empty_values:
+            raise ValidationError(model_field.error_messages['blank'], code='blank')
+        return value
+
+    def clean_record(self, cleaned_data, errors):
+        """
+        Validate fields depending on each other, like Form.clean.
+        """
+        pass
+
+    def validate_unique(self, cleaned_data):
+        """
+        Return errors for values of unique fields that are already
+        stored, with a single query. Like a ModelForm, fields that did
+        not validate are skipped.
+        """
+        names = [name for name in self.unique_fields if name in cleaned_data]
+        if not names:
+            return {}
+
+        lookup = Q()
+        for name in names:
+            lookup |= Q(**{name: cleaned_data[name]})
+
+        errors = {}
+        for row in self.model.objects.filter(lookup).values(*names):
+            errors.update(self.unique_errors(row, names, cleaned_data))
+        return errors
+
+    def unique_errors(self, row, names, cleaned_data):
+        """
+        Return errors for the fields of a stored row that clash with
+        cleaned_data.
+        """
+        instance = self.model(**cleaned_data)
+        return {
+            name: [instance.unique_error_message(self.model, (name,))]
+            for name in names if row[name] == cleaned_data[name]
+        }
+
+    def build(self, record, check_unique=True, **extra):
+        """
+        Return (instance, errors), where the instance is an unsaved
+        model instance ready for save() or bulk_create(), or None if
+        the record is invalid. extra is set on the instance as is.
+        """
+        cleaned_data, errors = self.clean(record)
+        if check_unique:
+            errors = {**errors, **self.validate_unique(cleaned_data)}
+        if errors:
+            return None, errors
+        return self.model(**cleaned_data, **extra), errors
+
+
+class ArticleValidator(RecordValidator):
+    """
+    Validates article records like forms.ArticleForm.
+    """
+    model = Article
+    fields = ('author', 'title', 'description', 'url', 'image_url', 'published_at', 'public')
+    unique_fields = ('url',)
+
+    def clean_title(self, title):
+        return strip_tags_and_format(title)
+
+    def clean_author(self, author):
+        return strip_tags_and_format(author)
+
+    def clean_description(self, description):
+        return strip_tags_and_format(description)
+
+    def clean_image_url(self, image_url):
+        # For Bing images
+        return image_url.replace('pid=News', 'pid=')
+
+
+class SourceValidator(RecordValidator):
+    """
+    Validates source records like forms.SourceForm.
+    """
+    model = Source
+    fields = ('name', 'slug')
+    unique_fields = ('name', 'slug')
+
+    def clean_name(self, name):
+        return strip_tags_and_format(name.lower())
+
+    def clean_record(self, cleaned_data, errors):
+        if cleaned_data['slug']:
+            return
+
+        slug = slugify(cleaned_data['name'])
+        try:
+            self.model_fields['slug'].run_validators(slug)
+        except ValidationError as e:
+            errors['slug'] = e.error_list
+            del cleaned_data['slug']
+        else:
+            cleaned_data['slug'] = slug
+
+
+article_validator = ArticleValidator()
+source_validator = SourceValidator()
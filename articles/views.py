@@ -1,7 +1,10 @@
 from django.views.generic import ListView, TemplateView
-from django.db.models import Count, Q
+from django.db.models import Q
 
-from .models import Article
+from .front_page import build_front_page_snapshot
+from .models import Article, FrontPageSnapshot
+from .pagination import KeysetPaginationMixin
+from .search import search_filter
 
 
 class ArticleListView(ListView):
@@ -12,32 +15,28 @@ class ArticleListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Define Q objects
-        daca_in_title = Q(title__icontains='daca')
-        empty_image_url = Q(image_url='')
+        # Read the front page computed at ingest time, building it again
+        # if there is none yet or an edit marked it stale.
+        snapshot = FrontPageSnapshot.objects.filter(pk=1).first()
+        if snapshot is None:
+            snapshot = build_front_page_snapshot()
 
-        # Get featured articles first
-        featured_articles = Article.objects.select_related('source').filter(
-            daca_in_title & ~empty_image_url).order_by('-published_at')[:4]
+        featured_ids = snapshot.featured_article_ids
+        recent_ids = snapshot.recent_article_ids
+        articles = Article.objects.select_related('source').in_bulk(featured_ids + recent_ids)
 
-        # Get recent articles, exclude ids from featured articles
-        id_exclude_list = [article.id for article in featured_articles]
-        recent_articles = Article.objects.select_related('source').filter(
-            ~empty_image_url & ~Q(id__in=id_exclude_list)).order_by('-published_at')[:12]
+        # Keep the snapshot order and skip articles deleted since.
+        featured_articles = [articles[pk] for pk in featured_ids if pk in articles]
+        recent_articles = [articles[pk] for pk in recent_ids if pk in articles]
 
-        # Get top 10 news sources
-        source_article_groupby = Article.objects.values(
-            'source__name').annotate(Count('id')).order_by('-id__count')[:10]
-        top_sources = [group['source__name'] for group in source_article_groupby]
-
-        context['lead_article'] = featured_articles[0]
+        context['lead_article'] = featured_articles[0] if featured_articles else None
         context['featured_articles'] = featured_articles[1:]
         context['recent_articles'] = recent_articles
-        context['top_sources'] = top_sources
+        context['top_sources'] = snapshot.top_sources
         return context
 
 
-class SearchView(ListView):
+class SearchView(KeysetPaginationMixin, ListView):
     model = Article
     template_name = 'articles/article_search.html'
     context_object_name = 'articles'
@@ -50,11 +49,7 @@ class SearchView(ListView):
         # Compile query Q objects with default
         query_filters = Q()
         if query:
-            query_filters = (
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(author__contains=query)
-            )
+            query_filters = search_filter(query)
 
         # Compile source Q objects with default
         sources_filters = Q()
@@ -78,7 +73,7 @@ class AboutView(TemplateView):
     template_name = 'about.html'
 
 
-class ArchiveView(ListView):
+class ArchiveView(KeysetPaginationMixin, ListView):
     model = Article
     template_name = 'articles/archive.html'
     context_object_name = 'articles'
@@ -4,6 +4,12 @@ set -ev
 
 python manage.py migrate
 
+# gunicorn workers and huey share their Prometheus metrics through files
+# in this directory, cleared on every start. See articles/metrics.py.
+export prometheus_multiproc_dir=/tmp/prometheus_metrics
+rm -rf "$prometheus_multiproc_dir"
+mkdir -p "$prometheus_multiproc_dir"
+
 python manage.py install_tailwind
 
 # Do not collect static when in dev environment.
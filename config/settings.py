@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'articles.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,25 +65,34 @@ MIDDLEWARE = [
 ]
 
 # Caching Settings for PRODUCTION!
-# https://docs.djangoproject.com/en/3.1/topics/cache/#the-per-site-cache
+# Article pages are cached until the next ingest run stores new articles,
+# see articles.middleware.IngestCacheMiddleware. It re-renders stale pages
+# through the middleware below it, so it must stay above the session and
+# auth middleware.
 if not DEBUG:
     MIDDLEWARE = [
+        'articles.metrics.MetricsMiddleware',
         'django.middleware.security.SecurityMiddleware',
         'whitenoise.middleware.WhiteNoiseMiddleware',
+        'articles.middleware.IngestCacheMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
-        'django.middleware.cache.UpdateCacheMiddleware',
         'django.middleware.common.CommonMiddleware',
-        'django.middleware.cache.FetchFromCacheMiddleware',
         'django.middleware.csrf.CsrfViewMiddleware',
         'django.contrib.auth.middleware.AuthenticationMiddleware',
         'django.contrib.messages.middleware.MessageMiddleware',
         'django.middleware.clickjacking.XFrameOptionsMiddleware',
     ]
 
-    CACHE_MIDDLEWARE_ALIAS = 'default'  # which cache alias to use
-    CACHE_MIDDLEWARE_SECONDS = 3000    # number of seconds to cache a page for (TTL)
-    # should be used if the cache is shared across multiple sites that use the same Django instance
-    CACHE_MIDDLEWARE_KEY_PREFIX = ''
+CACHE_MIDDLEWARE_ALIAS = 'default'  # which cache alias to use
+
+# Opt-in per request query, template and cache metrics, sent as
+# Server-Timing headers and JSON log fields. Requests over the query
+# budget log their most repeated queries.
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'False') == 'True'
+REQUEST_METRICS_QUERY_BUDGET = int(os.environ.get('REQUEST_METRICS_QUERY_BUDGET', 20))
+
+if REQUEST_METRICS_ENABLED:
+    MIDDLEWARE = ['articles.middleware.RequestMetricsMiddleware'] + MIDDLEWARE
 
 ROOT_URLCONF = 'config.urls'
 
@@ -196,6 +206,23 @@ HUEY = {
 }
 
 
+# News client HTTP settings
+# Timeouts are in seconds. The run deadline bounds a whole paginated fetch.
+# Pages after the first are fetched on up to NEWS_CLIENT_MAX_WORKERS
+# threads, 1 fetches them one after another.
+# Up to NEWS_CLIENT_PREFETCH_PAGES pages are fetched ahead of the page
+# being stored, 0 fetches and stores pages in turn. Either way a client
+# requests at most NEWS_CLIENT_MAX_WORKERS more pages than that.
+NEWS_CLIENT_CONNECT_TIMEOUT = float(os.environ.get('NEWS_CLIENT_CONNECT_TIMEOUT', 5))
+NEWS_CLIENT_READ_TIMEOUT = float(os.environ.get('NEWS_CLIENT_READ_TIMEOUT', 30))
+NEWS_CLIENT_MAX_RETRIES = int(os.environ.get('NEWS_CLIENT_MAX_RETRIES', 3))
+NEWS_CLIENT_BACKOFF_FACTOR = float(os.environ.get('NEWS_CLIENT_BACKOFF_FACTOR', 0.5))
+NEWS_CLIENT_POOL_SIZE = int(os.environ.get('NEWS_CLIENT_POOL_SIZE', 10))
+NEWS_CLIENT_RUN_DEADLINE = float(os.environ.get('NEWS_CLIENT_RUN_DEADLINE', 300))
+NEWS_CLIENT_MAX_WORKERS = int(os.environ.get('NEWS_CLIENT_MAX_WORKERS', 4))
+NEWS_CLIENT_PREFETCH_PAGES = int(os.environ.get('NEWS_CLIENT_PREFETCH_PAGES', 2))
+
+
 # Logging Settings
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 